@@ -0,0 +1,170 @@
+# Acceleration curves for the Circuit Playground Express accelerometer mouse
+# Author: David Boyd
+# License: MIT License (https://opensource.org/licenses/MIT)
+"""
+Lookup tables from acceleration to mouse velocity, built once so the mouse
+loop does no float math per axis beyond scaling the reading to an index.
+
+    table = build_table("quadratic", 0.5, 4.0, 12, scale=-1)
+    ...
+    i = int(x * STEPS_PER_MS2) + table.offset
+    x_mouse = table.values[min(max(i, 0), table.top)]   # in 1/ONE counts
+
+Velocities are fixed point with FRACTION_BITS fractional bits, so slow
+tilts keep their fraction of a count for the caller to accumulate.
+The table covers -ACCEL_LIMIT to +ACCEL_LIMIT m/s^2 in 1/STEPS_PER_MS2
+steps, readings beyond that clamp to the ends.  Sign and scale are baked
+in.  Between a_min and a_max the velocity follows one of CURVES:
+
+    linear       straight line, same as the original lerp()
+    quadratic    slow near a_min, fast near a_max
+    exponential  like quadratic, steeper, EXP_SHARPNESS sets how much
+    points       piecewise linear through user (accel, velocity) points
+
+    python accel_curve.py
+
+benchmarks a table lookup against the lerp() path it replaces.
+"""
+import array
+import math
+import random
+import time
+
+STEPS_PER_MS2 = 8
+ACCEL_LIMIT = 20
+EXP_SHARPNESS = 3.0
+FRACTION_BITS = 4
+ONE = 1 << FRACTION_BITS
+_LIMIT = 127 * ONE
+
+CURVES = ("linear", "quadratic", "exponential", "points")
+
+
+class CurveTable:
+    """
+    values[i] is the mouse velocity, in 1/ONE counts, for acceleration
+    (i - offset) steps.
+    """
+    def __init__(self, values, offset):
+        self.values = values
+        self.offset = offset
+        self.top = len(values) - 1
+
+    def velocity(self, accel):
+        i = int(accel * STEPS_PER_MS2) + self.offset
+        return self.values[min(max(i, 0), self.top)]
+
+
+def _shape(curve, t):
+    # t is the position between a_min and a_max, 0 to 1
+    if curve == "linear":
+        return t
+    if curve == "quadratic":
+        return t * t
+    if curve == "exponential":
+        return (math.exp(EXP_SHARPNESS * t) - 1) / (math.exp(EXP_SHARPNESS) - 1)
+    raise ValueError("unknown curve {}".format(curve))
+
+
+def _through_points(points, magnitude):
+    # points: ((accel, fraction of v_range), ...) in increasing accel
+    if magnitude <= points[0][0]:
+        return points[0][1]
+    for (a0, v0), (a1, v1) in zip(points, points[1:]):
+        if magnitude <= a1:
+            return v0 + (v1 - v0) * (magnitude - a0) / (a1 - a0)
+    return points[-1][1]
+
+
+def build_table(curve, a_min, a_max, v_range, scale=1, points=None):
+    """
+    Build the CurveTable for one axis.  a_min, a_max, v_range and scale
+    mean the same as XACCEL_MIN, XACCEL_MAX, XMOUSE_RANGE and XMOUSE_SCALE
+    in accel_mouse.py.  For the "points" curve, points is a sequence of
+    (acceleration, velocity) with velocity 0 to 1 of v_range, and a_min and
+    a_max are ignored.
+    """
+    if curve not in CURVES:
+        raise ValueError("unknown curve {}".format(curve))
+    if curve == "points" and not points:
+        raise ValueError("points curve needs points")
+    steps = ACCEL_LIMIT * STEPS_PER_MS2
+    values = array.array('h', [0] * (2 * steps + 1))
+    for i in range(steps + 1):
+        magnitude = i / STEPS_PER_MS2
+        if curve == "points":
+            v = v_range * _through_points(points, magnitude)
+        elif magnitude <= a_min:
+            v = 0.0
+        elif magnitude > a_max:
+            v = v_range
+        else:
+            v = v_range * _shape(curve, (magnitude - a_min) / (a_max - a_min))
+        v = min(max(int(round(v * scale * ONE)), -_LIMIT), _LIMIT)
+        values[steps + i] = v
+        values[steps - i] = -v
+    return CurveTable(values, steps)
+
+
+def lerp(value, v_min, v_max, d_min, d_max):
+    """
+    The per-sample path build_table() replaces, from accel_mouse.py.
+    """
+    if value <= v_min:
+        return d_min
+    elif value > v_max:
+        return d_max
+    else:
+        return d_min + (d_max - d_min)*((value-v_min)/(v_max-v_min))
+
+
+def _lerp_velocity(x, a_min, a_max, v_range, scale):
+    v = lerp(abs(x), a_min, a_max, 0.0, v_range)
+    if x < 0:
+        v *= -1.0
+    return v * scale
+
+
+def benchmark(samples=20000, a_min=0.5, a_max=4.0, v_range=12.0, scale=-1):
+    """
+    Return (lerp ns per axis, table ns per axis, largest difference between
+    the two on the same readings, in mouse counts).
+    """
+    readings = [random.uniform(-12.0, 12.0) for _ in range(samples)]
+    table = build_table("linear", a_min, a_max, v_range, scale)
+
+    start = time.monotonic_ns()
+    for x in readings:
+        math.floor(_lerp_velocity(x, a_min, a_max, v_range, scale))
+    lerp_ns = (time.monotonic_ns() - start) // samples
+
+    values = table.values
+    offset = table.offset
+    top = table.top
+    start = time.monotonic_ns()
+    for x in readings:
+        i = int(x * STEPS_PER_MS2) + offset
+        if i < 0:
+            i = 0
+        elif i > top:
+            i = top
+        values[i]
+    table_ns = (time.monotonic_ns() - start) // samples
+
+    worst = max(abs(table.velocity(x) / ONE - _lerp_velocity(x, a_min, a_max, v_range, scale))
+                for x in readings)
+    return lerp_ns, table_ns, worst
+
+
+def main():
+    lerp_ns, table_ns, worst = benchmark()
+    print("per axis: lerp {} ns, table {} ns, largest difference {:.2f}".format(
+        lerp_ns, table_ns, worst))
+    start = time.monotonic_ns()
+    for curve in CURVES[:3]:
+        build_table(curve, 0.5, 4.0, 12.0, -1)
+    print("table build: {} us per curve".format((time.monotonic_ns() - start) // 3000))
+
+
+if __name__ == "__main__":
+    main()
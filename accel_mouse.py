@@ -8,7 +8,12 @@
 # License: MIT License (https://opensource.org/licenses/MIT)
 from adafruit_circuitplayground.express import cpx
 from adafruit_hid.mouse import Mouse
-import time, math
+import time
+from micropython import const
+import accel_curve
+import lis3dh_fifo
+from debounce import Debouncer
+from accel_curve import STEPS_PER_MS2, FRACTION_BITS
 
 mouse = Mouse()
 
@@ -24,6 +29,11 @@ XACCEL_MIN = 0.5 # 0.1
 XACCEL_MAX = 4.0 # 8.0   
 XMOUSE_RANGE = 12.0 # 25.0 
 XMOUSE_SCALE = -1 # CHANGE THIS IF DIRECTION IS OPPOSITE WHAT YOU WANT
+# Shape of the curve from XACCEL_MIN to XACCEL_MAX: "linear", "quadratic",
+# "exponential" or "points" (see accel_curve.py), and the points for the last,
+# (acceleration, fraction of XMOUSE_RANGE).
+XCURVE = "linear"
+XCURVE_POINTS = ((0.5, 0.0), (2.0, 0.2), (4.0, 1.0))
 
 # Y axis  (up/down) configuration:
 # Note that the meaning of these values is exactly the same as the X axis above,
@@ -34,6 +44,8 @@ YACCEL_MIN = XACCEL_MIN
 YACCEL_MAX = XACCEL_MAX
 YMOUSE_RANGE = XMOUSE_RANGE
 YMOUSE_SCALE = 1 # CHANGE THIS IF DIRECTION IS OPPOSITE WHAT YOU WANT
+YCURVE = XCURVE
+YCURVE_POINTS = XCURVE_POINTS
 
 # Set False if holding Circuit Playground Express with USB cable facing up
 # Set True to swap the X/Y axis.  If USB cable is to the right or left 
@@ -41,33 +53,217 @@ SWAP_AXES = False
 # Interestingly, axes is the only word in English that can be the plural 
 # of three different singular noun forms--ax, axe, and AXIS.
 
-# Floating point linear interpolation function that takes a value inside one
-# range and maps it to a new value inside another range.  This is used to transform
-# each axis of acceleration to mouse velocity/speed. See this page for details
-# on the equation: https://en.wikipedia.org/wiki/Linear_interpolation
-def lerp(value, v_min, v_max, d_min, d_max):
+# Read the accelerometer through its FIFO: every sample since the last report
+# in one I2C burst, averaged ("mean") or "median" filtered and then smoothed,
+# see lis3dh_fifo.py.  False reads cpx.acceleration once per report instead.
+# The FIFO holds 80 ms at 400 Hz, so it only needs draining every
+# FIFO_READ_EVERY reports; in between the last filtered value is reused.
+USE_FIFO = True
+FIFO_FILTER = "mean"
+FIFO_SMOOTH_SHIFT = 1
+FIFO_READ_EVERY = 3
+
+# Latency tracing: set to 1 to time each stage of main() and print p50/p99
+# per stage on ctrl-C (see latency_trace.py).  At 0 the tracing code is
+# removed when the file is compiled, it costs nothing.
+_TRACE = const(0)
+TRACE_DEPTH = 256
+
+# Mouse reports per second, USB full speed mice usually run at 125, 250 or 500.
+REPORT_RATE_HZ = 125
+
+# The buttons are polled this often while waiting for the next report, and
+# ignore bounce for BUTTON_LOCKOUT_MS after each press or release.
+BUTTON_POLL_MS = 1
+BUTTON_LOCKOUT_MS = 20
+
+
+class ReportScheduler:
     """
-    Check if the input value is outside its value range (v_min < value > v_max) 
-    and clamp to desired min/max values (d_min < value > d_max).
+    Paces the main loop at a fixed rate against time.monotonic_ns().  The
+    time the loop body took is subtracted from the wait, and when the loop
+    is more than a period late the missed reports are skipped rather than
+    sent back to back.
     """
-    if value <= v_min:
-        return d_min
-    elif value > v_max:
-        return d_max
-    else:
-        # compute the return value based on val's position within its range and
-        #  the desired min & max.
-        return d_min + (d_max - d_min)*((value-v_min)/(v_max-v_min))
+    def __init__(self, rate_hz):
+        self.period_ns = 1000000000 // rate_hz
+        self.deadline = time.monotonic_ns() + self.period_ns
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.loops = 0
+        self.skipped = 0
+        self.work_ns = 0
+        self.max_work_ns = 0
+        self.jitter_ns = 0
+        self.max_jitter_ns = 0
+        self._woke = time.monotonic_ns()
+
+    def wait(self, poll=None, poll_ms=BUTTON_POLL_MS):
+        """
+        Sleep until the next report is due, calling poll() every poll_ms
+        meanwhile if given.  poll() is called at least once per wait, even
+        when the loop is already late.
+        """
+        now = time.monotonic_ns()
+        work = now - self._woke
+        self.loops += 1
+        self.work_ns += work
+        if work > self.max_work_ns:
+            self.max_work_ns = work
 
-def get_button_press():
+        if poll is not None:
+            # at least once per pass, so late passes still see the buttons
+            poll()
+            now = time.monotonic_ns()
+
+        if now < self.deadline:
+            if poll is not None:
+                slice_ns = poll_ms * 1000000
+                while True:
+                    time.sleep(min(self.deadline - now, slice_ns) / 1000000000)
+                    now = time.monotonic_ns()
+                    if now >= self.deadline:
+                        break
+                    poll()
+                    now = time.monotonic_ns()
+                    if now >= self.deadline:
+                        break
+            else:
+                time.sleep((self.deadline - now) / 1000000000)
+        elif now - self.deadline >= self.period_ns:
+            missed = (now - self.deadline) // self.period_ns
+            self.skipped += missed
+            self.deadline += missed * self.period_ns
+
+        self._woke = time.monotonic_ns()
+        # how far off the schedule this wakeup was
+        jitter = abs(self._woke - self.deadline)
+        self.jitter_ns += jitter
+        if jitter > self.max_jitter_ns:
+            self.max_jitter_ns = jitter
+        self.deadline += self.period_ns
+
+    def report(self):
+        loops = max(self.loops, 1)
+        print("reports: loops={} skipped={} work avg={}us max={}us jitter avg={}us max={}us".format(
+            self.loops, self.skipped, self.work_ns // loops // 1000,
+            self.max_work_ns // 1000, self.jitter_ns // loops // 1000,
+            self.max_jitter_ns // 1000))
+
+
+class MotionAccumulator:
     """
-    Using a function to handle button press, this makes it easier to add
-    additional debounce, sound or led indications to a button press
+    Collects each pass's motion and button state and sends as few mouse
+    reports as possible.  Velocities are fixed point (see accel_curve), the
+    fraction of a count left over is carried to the next pass so slow tilts
+    still move the pointer.  Nothing is sent when there is no whole count
+    to move and the buttons haven't changed, and a button change that comes
+    with motion goes out in the same report.
+
+    Click latency, from the button event to its report, is kept in
+    clicks, click_ns and max_click_ns.
     """
-    left = cpx.button_a
-    right = cpx.button_b
+    def __init__(self, mouse):
+        self._mouse = mouse
+        self.x = 0
+        self.y = 0
+        self.buttons = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.sent = 0
+        self.suppressed = 0
+        self.merged = 0
+        self.clicks = 0
+        self.click_ns = 0
+        self.max_click_ns = 0
 
-    return left, right
+    def update(self, dx, dy, buttons, event_ns=0):
+        """
+        Add dx, dy (fixed point) and send whatever is due with buttons as
+        the new button state.  event_ns is when the button change was
+        seen, for the latency statistics.
+        """
+        x = self.x + dx
+        y = self.y + dy
+        move_x = x >> FRACTION_BITS
+        move_y = y >> FRACTION_BITS
+        self.x = x - (move_x << FRACTION_BITS)
+        self.y = y - (move_y << FRACTION_BITS)
+
+        mouse = self._mouse
+        changed = buttons != self.buttons
+        if move_x or move_y:
+            if changed:
+                # move() sends mouse.report[0] as the button state
+                mouse.report[0] = buttons
+                self.merged += 1
+            mouse.move(x = move_x, y = move_y)
+            self.sent += 1
+        elif changed:
+            pressed = buttons & ~self.buttons
+            released = self.buttons & ~buttons
+            if pressed:
+                mouse.press(pressed)
+                self.sent += 1
+            if released:
+                mouse.release(released)
+                self.sent += 1
+        else:
+            self.suppressed += 1
+            return
+        if changed and event_ns:
+            latency = time.monotonic_ns() - event_ns
+            self.clicks += 1
+            self.click_ns += latency
+            if latency > self.max_click_ns:
+                self.max_click_ns = latency
+        self.buttons = buttons
+
+    def report(self):
+        print("mouse: sent={} suppressed={} merged={} click latency avg={}us max={}us".format(
+            self.sent, self.suppressed, self.merged,
+            self.click_ns // max(self.clicks, 1) // 1000, self.max_click_ns // 1000))
+
+
+# Acceleration to mouse velocity lookup tables, one per axis, with the curve,
+# direction and scaling built in.  Worked out once here so the loop only has
+# to index them.
+x_table = accel_curve.build_table(XCURVE, XACCEL_MIN, XACCEL_MAX, XMOUSE_RANGE,
+                                  XMOUSE_SCALE, XCURVE_POINTS)
+y_table = accel_curve.build_table(YCURVE, YACCEL_MIN, YACCEL_MAX, YMOUSE_RANGE,
+                                  YMOUSE_SCALE, YCURVE_POINTS)
+X_VALUES, X_OFFSET, X_TOP = x_table.values, x_table.offset, x_table.top
+Y_VALUES, Y_OFFSET, Y_TOP = y_table.values, y_table.offset, y_table.top
+
+# Button A is the left mouse button, B the right.  Events are queued by
+# buttons.poll(), which runs while the scheduler waits.
+buttons = Debouncer((lambda: cpx.button_a, lambda: cpx.button_b), BUTTON_LOCKOUT_MS)
+BUTTON_MASKS = (Mouse.LEFT_BUTTON, Mouse.RIGHT_BUTTON)
+
+motion = MotionAccumulator(mouse)
+
+# trace stages: waiting for the report slot, accelerometer read, curve
+# lookup, button events, HID send, and from the accelerometer read to the
+# report that carried it
+_ST_WAIT = const(0)
+_ST_READ = const(1)
+_ST_CURVE = const(2)
+_ST_BUTTONS = const(3)
+_ST_SEND = const(4)
+_ST_TILT_TO_HID = const(5)
+if _TRACE:
+    from latency_trace import LatencyTrace
+    trace = LatencyTrace(("wait", "read", "curve", "buttons", "send", "tilt-to-hid"),
+                         TRACE_DEPTH)
+    sampled_ns = 0
+
+if USE_FIFO:
+    # the FIFO is read through the LIS3DH driver's I2C device
+    fifo = lis3dh_fifo.FifoReader(cpx._lis3dh._i2c, FIFO_FILTER, FIFO_SMOOTH_SHIFT)
+else:
+    fifo = None
 
 def main():
     """
@@ -76,65 +272,86 @@ def main():
     the slide switch.
     """
     if cpx.switch:
-            
-        # Grab initial left & right button states to later check if they are pressed
-        # or released.  Do this early in the loop so other processing can take some
-        # time and the button state change can be detected.
-        left_first, right_first = get_button_press()
-
-        # Grab x, y acceleration values, z is ignored 
-        x, y, z = cpx.acceleration
-        
-        # Use the magnitude of acceleration to interpolate the mouse velocity.
-        x_mag = abs(x)
-        x_mouse = lerp(x_mag, XACCEL_MIN, XACCEL_MAX, 0.0, XMOUSE_RANGE)
-
-        y_mag = abs(y)
-        y_mouse = lerp(y_mag, YACCEL_MIN, YACCEL_MAX, 0.0, YMOUSE_RANGE)
-
-        # Change the mouse direction based on the direction of the acceleration.
-        if x < 0:
-            x_mouse *= -1.0
-        if y < 0:
-            y_mouse *= -1.0
-
-        # Apply any global scaling to the axis (to flip it for example) and truncate
-        # to an integer value.
-        x_mouse = math.floor(x_mouse*XMOUSE_SCALE)
-        y_mouse = math.floor(y_mouse*YMOUSE_SCALE)
-
-        # Move mouse.
-        if not SWAP_AXES:
-            # Non-flipped axes, just map board X/Y to mouse X/Y.
-            mouse.move(x = x_mouse, y = y_mouse)
+        if _TRACE:
+            global sampled_ns
+            read_ns = trace.lap(_ST_WAIT)
+
+        # Grab x, y acceleration in curve table steps, z is ignored
+        if fifo is not None:
+            if scheduler.loops % FIFO_READ_EVERY == 0:
+                fifo.read()
+                if _TRACE:
+                    sampled_ns = read_ns
+            x_steps, y_steps = fifo.steps()
         else:
+            x, y, z = cpx.acceleration
+            x_steps = int(x * STEPS_PER_MS2)
+            y_steps = int(y * STEPS_PER_MS2)
+            if _TRACE:
+                sampled_ns = read_ns
+        if _TRACE:
+            trace.lap(_ST_READ)
+
+        # Look the mouse velocity up in each axis' curve table, clamping
+        # readings beyond the table to its ends.
+        i = x_steps + X_OFFSET
+        if i < 0:
+            i = 0
+        elif i > X_TOP:
+            i = X_TOP
+        x_mouse = X_VALUES[i]
+
+        i = y_steps + Y_OFFSET
+        if i < 0:
+            i = 0
+        elif i > Y_TOP:
+            i = Y_TOP
+        y_mouse = Y_VALUES[i]
+
+        if SWAP_AXES:
             # Flipped axes, swap them around.
-            mouse.move(x = y_mouse, y = x_mouse)
+            x_mouse, y_mouse = y_mouse, x_mouse
+        if _TRACE:
+            trace.lap(_ST_CURVE)
+
+        # Apply queued button events in order.  All but the last go out on
+        # their own, so a click that came and went since the last pass is
+        # still a press and a release; the last one shares the report with
+        # the motion.
+        pressed = motion.buttons
+        event_ns = 0
+        event = buttons.get()
+        while event is not None:
+            index, down, event_ns = event
+            if down:
+                pressed |= BUTTON_MASKS[index]
+            else:
+                pressed &= ~BUTTON_MASKS[index]
+            event = buttons.get()
+            if event is not None:
+                motion.update(0, 0, pressed, event_ns)
+        if _TRACE:
+            trace.lap(_ST_BUTTONS)
+            sent = motion.sent
 
-        # Small delay to wait for button state changes and slow down processing a bit.
-        time.sleep(.01) 
+        # Move mouse and update buttons, in one report where possible.
+        motion.update(x_mouse, y_mouse, pressed, event_ns)
 
-        # Grab a second button state reading to check if the buttons were pressed or
-        # released.
-        left_second, right_second = get_button_press()
+        if _TRACE:
+            sent_ns = trace.lap(_ST_SEND)
+            if motion.sent != sent:
+                trace.set(_ST_TILT_TO_HID, sent_ns - sampled_ns)
+            trace.next()
 
-        # Check for left button pressed / released.
-        if not left_first and left_second:
-            # button was pressed
-            mouse.press(Mouse.LEFT_BUTTON)
-        elif left_first and not left_second:
-            # button was released
-            mouse.release(Mouse.LEFT_BUTTON)
-            
+    else:
+        # buttons pressed while the mouse is off are ignored
+        while buttons.get() is not None:
+            pass
+        if _TRACE:
+            trace.start()
 
-        # Check for right button pressed / released.
-        if not right_first and right_second:
-            # button was pressed!
-            mouse.press(Mouse.RIGHT_BUTTON)
-        elif right_first and not right_second:
-            # button was released!
-            mouse.release(Mouse.RIGHT_BUTTON)
 
+scheduler = ReportScheduler(REPORT_RATE_HZ)
 
 try:    
     # print one tme at the beginning if switch is off 
@@ -142,12 +359,18 @@ try:
         print("*****************************************************")
         print("*** mouse movement is off, slide switch to enable ***")
         print("*****************************************************")
-    # Loop
+    # Loop, at most one mouse report per scheduler period
     while True:
         main()
+        scheduler.wait(buttons.poll)
 
 except KeyboardInterrupt:
     # perform any cleanup if ctrl-c is hit
-    pass 
+    scheduler.report()
+    motion.report()
+    if fifo is not None:
+        fifo.report()
+    if _TRACE:
+        trace.report()
 except Exception as e:    
     print("Exception:", str(e))
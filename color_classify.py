@@ -0,0 +1,225 @@
+# Nearest named color classifier for Circuit Playground Express color sensing
+# Author: David Boyd
+# License: MIT License (https://opensource.org/licenses/MIT)
+"""
+Turns (r, g, b) readings from color_sense into names from a palette.
+
+    classifier = ColorClassifier((("red brick", (200, 40, 30)),
+                                  ("blue brick", (30, 60, 190))),
+                                 threshold=80)
+    name = classifier.classify(sense_color())
+
+The color cube is cut into a grid of 2**bits cells per axis and, once, when
+the classifier is built, each cell gets the short list of palette entries
+that can be nearest to some point in it: those whose closest approach to the
+cell is no further than the furthest corner of the entry that is nearest at
+worst.  classify() then looks the reading's cell up and only measures the
+distance to those few entries, so the answer is exactly the nearest entry
+and the cost does not grow with the palette.  Cells hold one to a few
+entries, more bits make the lists shorter at 8x the memory per bit.
+
+The grid is two bytes per cell, the lists are shared between cells that
+have the same ones.  For color_sense's 8 entry palette bits=3 keeps a 1 KB
+grid and about 220 bytes of lists, roughly 1.5 KB of gc.mem_free() with
+the object headers, and building leaves a few KB of short lived garbage.
+bits=4 needs an 8 KB grid, too much next to the cpx library on a 32 KB
+SAMD21.
+
+    python color_classify.py
+
+benchmarks the grid against a linear scan of the palette.
+"""
+import array
+import random
+import time
+
+
+class ColorClassifier:
+
+    def __init__(self, palette, bits=4, threshold=None):
+        """
+        palette is a sequence of (name, (r, g, b)), at most 255 entries.
+        Readings further than threshold (euclidean, in 0 to 255 component
+        units) from every entry classify as None.
+        """
+        if not 0 < len(palette) < 256:
+            raise ValueError("palette must have 1 to 255 entries")
+        if not 1 <= bits <= 8:
+            raise ValueError("bits must be 1 to 8")
+        self.names = tuple(name for name, _ in palette)
+        self._red = bytes(rgb[0] for _, rgb in palette)
+        self._green = bytes(rgb[1] for _, rgb in palette)
+        self._blue = bytes(rgb[2] for _, rgb in palette)
+        self._bits = bits
+        self._shift = 8 - bits
+        self._limit = None if threshold is None else threshold * threshold
+        self._grid = self._build()
+
+    @staticmethod
+    def _axis(values, cells, size):
+        """
+        Squared distance along one axis from each entry to the nearest and
+        to the furthest component of each cell, indexed entry * cells + cell.
+        """
+        near = array.array('H', bytes(2 * len(values) * cells))
+        far = array.array('H', bytes(2 * len(values) * cells))
+        index = 0
+        for v in values:
+            for i in range(cells):
+                low = i * size
+                high = low + size - 1
+                if v < low:
+                    near[index] = (low - v) ** 2
+                elif v > high:
+                    near[index] = (v - high) ** 2
+                far[index] = max(v - low, high - v) ** 2
+                index += 1
+        return near, far
+
+    def _build(self):
+        """
+        Fill self._lists with the candidate lists, each a count byte and
+        that many palette indexes, and return the grid of offsets into it.
+        """
+        cells = 1 << self._bits
+        size = 1 << self._shift
+        count = len(self.names)
+        red_near, red_far = self._axis(self._red, cells, size)
+        green_near, green_far = self._axis(self._green, cells, size)
+        blue_near, blue_far = self._axis(self._blue, cells, size)
+
+        lists = bytearray()
+        offsets = {}
+        grid = array.array('H', bytes(2 * cells * cells * cells))
+        near_rg = array.array('L', [0] * count)
+        far_rg = array.array('L', [0] * count)
+        index = 0
+        self.max_candidates = 0
+        for ri in range(cells):
+            for gi in range(cells):
+                for p in range(count):
+                    near_rg[p] = red_near[p * cells + ri] + green_near[p * cells + gi]
+                    far_rg[p] = red_far[p * cells + ri] + green_far[p * cells + gi]
+                for bi in range(cells):
+                    # no point of the cell is further than this from its nearest entry
+                    bound = min(far_rg[p] + blue_far[p * cells + bi] for p in range(count))
+                    candidates = bytes(p for p in range(count)
+                                       if near_rg[p] + blue_near[p * cells + bi] <= bound)
+                    offset = offsets.get(candidates)
+                    if offset is None:
+                        offset = len(lists)
+                        if offset > 0xFFFF:
+                            raise ValueError("too many distinct cells, use fewer bits")
+                        offsets[candidates] = offset
+                        lists.append(len(candidates))
+                        lists.extend(candidates)
+                    grid[index] = offset
+                    index += 1
+                    if len(candidates) > self.max_candidates:
+                        self.max_candidates = len(candidates)
+        self._lists = lists
+        return grid
+
+    def nearest(self, rgb):
+        """
+        Return (palette index, squared distance) of the entry nearest rgb,
+        the lowest index on a tie.
+        """
+        r, g, b = rgb
+        shift = self._shift
+        bits = self._bits
+        lists = self._lists
+        offset = self._grid[(((r >> shift) << bits) | (g >> shift)) << bits | (b >> shift)]
+        best = lists[offset + 1]
+        dr = r - self._red[best]
+        dg = g - self._green[best]
+        db = b - self._blue[best]
+        best_d = dr * dr + dg * dg + db * db
+        for i in range(offset + 2, offset + 1 + lists[offset]):
+            p = lists[i]
+            dr = r - self._red[p]
+            dg = g - self._green[p]
+            db = b - self._blue[p]
+            d = dr * dr + dg * dg + db * db
+            if d < best_d:
+                best = p
+                best_d = d
+        return best, best_d
+
+    def classify(self, rgb):
+        """
+        Return the name of the palette entry nearest to rgb, or None if it
+        is beyond the threshold.
+        """
+        p, distance = self.nearest(rgb)
+        if self._limit is not None and distance > self._limit:
+            return None
+        return self.names[p]
+
+    def nearest_exact(self, rgb):
+        """
+        nearest() by scanning the whole palette, for comparison.
+        """
+        r, g, b = rgb
+        best = 0
+        best_d = None
+        for p in range(len(self.names)):
+            dr = r - self._red[p]
+            dg = g - self._green[p]
+            db = b - self._blue[p]
+            d = dr * dr + dg * dg + db * db
+            if best_d is None or d < best_d:
+                best = p
+                best_d = d
+        return best, best_d
+
+
+def random_palette(size, seed=1):
+    rng = random.Random(seed) if hasattr(random, "Random") else random
+    return [("color {}".format(i),
+             (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+            for i in range(size)]
+
+
+def benchmark(sizes=(8, 32, 64), bits=4, samples=2000):
+    """
+    Return [(palette size, build ms, grid ns per lookup, scan ns per lookup,
+    fraction where both agree, most candidates in a cell)].
+    """
+    results = []
+    readings = [(random.randrange(256), random.randrange(256), random.randrange(256))
+                for _ in range(samples)]
+    for size in sizes:
+        start = time.monotonic_ns()
+        classifier = ColorClassifier(random_palette(size), bits)
+        build = time.monotonic_ns() - start
+
+        start = time.monotonic_ns()
+        for rgb in readings:
+            classifier.nearest(rgb)
+        grid_ns = (time.monotonic_ns() - start) // samples
+
+        start = time.monotonic_ns()
+        for rgb in readings:
+            classifier.nearest_exact(rgb)
+        scan_ns = (time.monotonic_ns() - start) // samples
+
+        agree = 0
+        for rgb in readings:
+            if classifier.nearest(rgb) == classifier.nearest_exact(rgb):
+                agree += 1
+        results.append((size, build / 1000000, grid_ns, scan_ns,
+                        agree / samples, classifier.max_candidates))
+    return results
+
+
+def main():
+    print("{:>8}{:>12}{:>10}{:>10}{:>9}{:>10}".format(
+        "palette", "build ms", "grid ns", "scan ns", "agree", "max cand"))
+    for size, build, grid_ns, scan_ns, agree, candidates in benchmark():
+        print("{:>8}{:>12.1f}{:>10}{:>10}{:>8.1f}%{:>10}".format(
+            size, build, grid_ns, scan_ns, agree * 100, candidates))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,16 @@
 #  colored object right above the light sensor and NeoPixel #1 (upper
 #  left part of board, look for the eye symbol next to the color sensor) when
 #  performing the color sense.
+#
+#  Slide the switch to the left (on) to sense continuously instead; the
+#  filtered values stream to the REPL.  The other pixels stay dark while
+#  streaming and show the last color once the switch is turned off.
+#
+#  Press both buttons together to calibrate: hold something black over the
+#  sensor and press A, then something white and press A again.  The
+#  calibration is kept in non-volatile memory and reloaded at startup.
+#
+#  Each sensed color is also named from PALETTE (see color_classify.py).
 # 
 # Author: David Boyd
 # Adapted from color_sense.ino by (Limor Fried & Tony DiCola)
@@ -21,83 +31,462 @@
 # License: MIT License (https://opensource.org/licenses/MIT)
 from adafruit_circuitplayground.express import cpx
 import time
-from simpleio import map_range
+import array
+import struct
+try:
+    from microcontroller import nvm
+except ImportError:
+    nvm = None
+from color_classify import ColorClassifier
+from pixel_frame import PixelFrame
 
 LIGHT_SETTLE_MS = 0.1 # 100 ms
+CLEAR_SETTLE = 0.5
+CHANNEL_GAP = 0.01
+
+# Adaptive settling: instead of the fixed waits above, poll the light sensor
+# and take the reading once SETTLE_COUNT successive polls agree within
+# SETTLE_TOLERANCE.  The fixed waits become the timeout.
+ADAPTIVE_SETTLE = True
+SETTLE_MIN = 0.01      # always wait this long after changing the pixel
+SETTLE_POLL = 0.005
+SETTLE_TOLERANCE = 2
+SETTLE_COUNT = 2
+
+# Streaming: samples kept per channel, and the EMA smoothing shift
+# (each sample moves the average 1 / 2**EMA_SHIFT of the way).
+STREAM_DEPTH = 5
+EMA_SHIFT = 2
+
+# cpx.light reads 0 to 329.  Readings less the ambient light (all pixels
+# off) index the calibration tables directly.
+LIGHT_LEVELS = 330
+
+# Uncalibrated references, the old map_range(raw, 0, 255, 0, 330) scale.
+DEFAULT_DARK = (0, 0, 0)
+DEFAULT_WHITE = (197, 197, 197)
+
+# Calibration record in nvm: magic, then dark and white references per channel.
+# The references are ambient subtracted, records saved before that ("cs")
+# are ignored.
+CAL_OFFSET = 0
+CAL_FORMAT = "<2s6H"
+CAL_MAGIC = b"ca"
+
+# Names for sensed colors, and how far off a reading may be and still count.
+PALETTE = (
+    ("red", (255, 40, 30)),
+    ("orange", (255, 120, 30)),
+    ("yellow", (255, 230, 40)),
+    ("green", (40, 200, 60)),
+    ("blue", (30, 70, 230)),
+    ("purple", (140, 50, 200)),
+    ("white", (255, 255, 255)),
+    ("black", (0, 0, 0)),
+)
+PALETTE_THRESHOLD = 90
+# Classifier grid resolution, 2**bits cells per axis (see color_classify.py).
+PALETTE_BITS = 3
+
 RED = (255, 0, 0)
 GREEN = (0, 255, 0)
 BLUE = (0, 0, 255)
 CLEAR = (0, 0, 0)
 
-def sense_color(verbose_out = False):
+# All pixel changes go through here and reach the strip on show().
+pixels = PixelFrame(cpx.pixels)
+
+class SettleStats:
+    """
+    How long adaptive settling took, over all readings since reset(), in
+    integer nanoseconds.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+        self.timeouts = 0
+
+    def add(self, elapsed_ns, timed_out):
+        self.count += 1
+        self.total_ns += elapsed_ns
+        if self.min_ns is None or elapsed_ns < self.min_ns:
+            self.min_ns = elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+        if timed_out:
+            self.timeouts += 1
+
+    def report(self):
+        if not self.count:
+            print("settle: no readings")
+            return
+        print("settle: n={} avg={:.1f}ms min={:.1f}ms max={:.1f}ms timeouts={}".format(
+            self.count, self.total_ns / self.count / 1000000,
+            self.min_ns / 1000000, self.max_ns / 1000000, self.timeouts))
+
+
+settle_stats = SettleStats()
+
+
+def read_settled(timeout):
+    """
+    Poll the light sensor until it stops changing, or until timeout
+    seconds have passed, and return the last reading.
+    """
+    start = time.monotonic_ns()
+    timeout_ns = int(timeout * 1000000000)
+    time.sleep(SETTLE_MIN)
+    last = cpx.light
+    stable = 0
+    timed_out = False
+    while stable < SETTLE_COUNT:
+        time.sleep(SETTLE_POLL)
+        value = cpx.light
+        if abs(value - last) <= SETTLE_TOLERANCE:
+            stable += 1
+        else:
+            stable = 0
+        last = value
+        if time.monotonic_ns() - start >= timeout_ns:
+            timed_out = True
+            break
+    settle_stats.add(time.monotonic_ns() - start, timed_out)
+    return last
+
+
+def read_light(delay, adaptive):
+    """
+    Light reading after the pixel changed: a fixed delay, or adaptive
+    settling with delay as the timeout.
+    """
+    if adaptive:
+        return read_settled(delay)
+    time.sleep(delay)
+    return cpx.light
+
+
+def sense_raw(verbose_out = False, adaptive = ADAPTIVE_SETTLE):
     """
     Flash the neopixel closest to the light sensor Red, Green and
-    Blue and measure the amount of light reflected by each color
+    Blue and measure the amount of light reflected by each color, less
+    the ambient light measured with all pixels off.
     """
-    cpx.pixels.fill(CLEAR) # clear pixels so they don't interfere
-    time.sleep(.5)
+    pixels.fill(CLEAR) # clear pixels so they don't interfere
+    pixels.show()
+    ambient = read_light(CLEAR_SETTLE, adaptive)
+    if verbose_out:
+        print("raw ambient = {}".format(ambient))
     # Save the current pixel brightness so it can later be restored.  Then bump
     # the brightness to max to make sure the LED is as bright as possible for
     # the color readings.
-    old_brightness = cpx.pixels.brightness
-    cpx.pixels.brightness = 1.0
+    old_brightness = pixels.brightness
+    pixels.brightness = 1.0
     
     # Set pixel 1 (next to the light sensor) to full red, green, blue
     # color and grab a light sensor reading.  Make sure to wait a bit
     # after changing pixel colors to let the light sensor change
     # resistance!
-    cpx.pixels[1] = RED
-    time.sleep(LIGHT_SETTLE_MS)
-    raw_red = cpx.light
-    cpx.pixels[1] = CLEAR
-    time.sleep(.01)
+    pixels[1] = RED
+    pixels.show()
+    raw_red = read_light(LIGHT_SETTLE_MS, adaptive)
+    pixels[1] = CLEAR
+    if not adaptive:
+        pixels.show()
+        time.sleep(CHANNEL_GAP)
     if verbose_out:
         print("raw red = {}".format(raw_red))
     
-    cpx.pixels[1] = GREEN
-    time.sleep(LIGHT_SETTLE_MS)
-    raw_green = cpx.light
-    cpx.pixels[1] = CLEAR
-    time.sleep(.01)
+    pixels[1] = GREEN
+    pixels.show()
+    raw_green = read_light(LIGHT_SETTLE_MS, adaptive)
+    pixels[1] = CLEAR
+    if not adaptive:
+        pixels.show()
+        time.sleep(CHANNEL_GAP)
     if verbose_out:
         print("raw green = {}".format(raw_green))
 
-    cpx.pixels[1] = BLUE
-    time.sleep(LIGHT_SETTLE_MS)
-    raw_blue = cpx.light
-    cpx.pixels[1] = CLEAR
-    time.sleep(.01)
+    pixels[1] = BLUE
+    pixels.show()
+    raw_blue = read_light(LIGHT_SETTLE_MS, adaptive)
+    pixels[1] = CLEAR
+    if not adaptive:
+        pixels.show()
+        time.sleep(CHANNEL_GAP)
     if verbose_out:
         print("raw blue = {}".format(raw_blue))
 
     # Turn off the pixel and restore brightness, we're done with readings.
-    cpx.pixels.brightness = old_brightness
+    pixels.brightness = old_brightness
+    pixels.show()
+
+    return (max(raw_red - ambient, 0), max(raw_green - ambient, 0),
+            max(raw_blue - ambient, 0))
+
+
+def sense_color(verbose_out = False, adaptive = ADAPTIVE_SETTLE):
+    """
+    Sense the color and return its red, green and blue components, 0 to 255,
+    through the calibration tables.
+    """
+    raw_red, raw_green, raw_blue = sense_raw(verbose_out, adaptive)
+    return red_table[raw_red], green_table[raw_green], blue_table[raw_blue]
+
+
+def build_table(dark, white):
+    """
+    Lookup table from raw light reading to a 0 to 255 component, linear
+    between the dark and white references.
+    """
+    table = bytearray(LIGHT_LEVELS)
+    span = max(white - dark, 1)
+    for raw in range(dark + 1, LIGHT_LEVELS):
+        table[raw] = min((raw - dark) * 255 // span, 255)
+    return table
+
+
+def set_calibration(dark, white):
+    """
+    Rebuild the per channel tables from (r, g, b) dark and white references.
+    """
+    global red_table, green_table, blue_table, calibration
+    red_table = build_table(dark[0], white[0])
+    green_table = build_table(dark[1], white[1])
+    blue_table = build_table(dark[2], white[2])
+    calibration = (tuple(dark), tuple(white))
+
+
+def save_calibration():
+    """
+    Store the references in nvm, returns False if there is no nvm.  The
+    tables themselves are rebuilt from them at startup.
+    """
+    if nvm is None:
+        return False
+    dark, white = calibration
+    record = struct.pack(CAL_FORMAT, CAL_MAGIC, *(dark + white))
+    nvm[CAL_OFFSET:CAL_OFFSET + len(record)] = record
+    return True
+
+
+def load_calibration():
+    """
+    Set the calibration from nvm, or the defaults if none was saved.
+    Returns True if a saved calibration was found.
+    """
+    if nvm is not None:
+        size = struct.calcsize(CAL_FORMAT)
+        record = struct.unpack(CAL_FORMAT, bytes(nvm[CAL_OFFSET:CAL_OFFSET + size]))
+        if record[0] == CAL_MAGIC:
+            set_calibration(record[1:4], record[4:7])
+            return True
+    set_calibration(DEFAULT_DARK, DEFAULT_WHITE)
+    return False
+
+
+def wait_for_button_a():
+    while not cpx.button_a:
+        time.sleep(.01)
+    time.sleep(.05) # debounce
+    while cpx.button_a:
+        time.sleep(.01)
+
+
+def calibrate():
+    """
+    Take the dark and white references, each channel lit in turn as for a
+    reading, and save them.  Like every reading they are taken less the
+    ambient light, so they still hold when the room light changes.
+    """
+    pixels.fill(CLEAR)
+    pixels.show()
+    print("calibrate: hold black over the sensor and press A")
+    wait_for_button_a()
+    dark = sense_raw()
+    print("calibrate: hold white over the sensor and press A")
+    wait_for_button_a()
+    white = sense_raw()
+    print("calibrate: dark = {} white = {}".format(dark, white))
+    set_calibration(dark, white)
+    if not save_calibration():
+        print("calibrate: no nvm, calibration is lost on reset")
+
+
+load_calibration()
+classifier = ColorClassifier(PALETTE, bits=PALETTE_BITS, threshold=PALETTE_THRESHOLD)
+
+
+class StreamStats:
+    """
+    Frames produced and samples dropped by stream_colors().
+    """
+    def __init__(self):
+        self.reset()
 
-    # Now scale down each of the raw readings to be within 0 to 255.  
-    red = map_range(raw_red, 0, 255, 0, 330)
-    green = map_range(raw_green, 0, 255, 0, 330)
-    blue = map_range(raw_blue, 0, 255, 0, 330)
+    def reset(self):
+        self.frames = 0
+        self.samples = 0
+        self.dropped = 0
 
-    return int(red), int(green), int(blue)
+    def report(self):
+        print("stream: frames={} samples={} dropped={}".format(
+            self.frames, self.samples, self.dropped))
+
+
+stream_stats = StreamStats()
+
+
+def _median(ring, count, scratch):
+    """
+    Median of the first count values of ring, sorted in scratch.
+    """
+    for i in range(count):
+        value = ring[i]
+        j = i
+        while j and scratch[j - 1] > value:
+            scratch[j] = scratch[j - 1]
+            j -= 1
+        scratch[j] = value
+    return scratch[count // 2]
+
+
+def stream_colors(rate_hz=10, filter_mode="median", depth=STREAM_DEPTH):
+    """
+    Generator that senses continuously, cycling the pixel through off
+    (for the ambient light), red, green and blue, and yields a filtered
+    (r, g, b) every rate_hz-th of a second.  filter_mode is "median" (of
+    the last depth samples per channel) or "ema" (exponential moving
+    average).
+
+    Each slot gets a quarter of the frame period to settle before it is
+    read.  When the loop falls behind, late samples are skipped rather than
+    taken back to back, and counted in stream_stats.dropped.
+
+    Keep the other pixels dark while streaming, their light reaches the
+    sensor.  Call close() when done, that restores the brightness.
+    """
+    colors = (CLEAR, RED, GREEN, BLUE)
+    tables = (red_table, green_table, blue_table)
+    period_ns = 1000000000 // (rate_hz * 4)
+    rings = (array.array('H', [0] * depth), array.array('H', [0] * depth),
+             array.array('H', [0] * depth))
+    scratch = array.array('H', [0] * depth)
+    # EMA is kept in fixed point, 4 fractional bits
+    ema = array.array('L', [0, 0, 0])
+    ambient = 0
+    filled = 0
+    pos = 0
+    use_median = filter_mode == "median"
+
+    old_brightness = pixels.brightness
+    pixels.brightness = 1.0
+    try:
+        slot = 0
+        pixels[1] = colors[0]
+        pixels.show()
+        deadline = time.monotonic_ns() + period_ns
+        while True:
+            now = time.monotonic_ns()
+            if now < deadline:
+                time.sleep((deadline - now) / 1000000000)
+            elif now - deadline >= period_ns:
+                # too late for this slot, resync instead of bunching up
+                missed = (now - deadline) // period_ns
+                stream_stats.dropped += missed
+                deadline += missed * period_ns
+
+            raw = cpx.light
+            stream_stats.samples += 1
+            if slot == 0:
+                ambient = raw
+            else:
+                channel = slot - 1
+                raw = max(raw - ambient, 0)
+                rings[channel][pos] = raw
+                if not use_median:
+                    if filled:
+                        ema[channel] += ((raw << 4) - ema[channel]) >> EMA_SHIFT
+                    else:
+                        ema[channel] = raw << 4
+
+            slot += 1
+            if slot == 4:
+                slot = 0
+                pos += 1
+                if pos == depth:
+                    pos = 0
+                if filled < depth:
+                    filled += 1
+            pixels[1] = colors[slot]
+            pixels.show()
+            deadline += period_ns
+
+            if slot == 0:
+                stream_stats.frames += 1
+                if use_median:
+                    yield (tables[0][_median(rings[0], filled, scratch)],
+                           tables[1][_median(rings[1], filled, scratch)],
+                           tables[2][_median(rings[2], filled, scratch)])
+                else:
+                    yield (tables[0][ema[0] >> 4], tables[1][ema[1] >> 4],
+                           tables[2][ema[2] >> 4])
+    finally:
+        pixels[1] = CLEAR
+        pixels.brightness = old_brightness
+        pixels.show()
 
 
 try:
-    cpx.pixels.brightness = .2
+    pixels.brightness = .2
     verbose = False
 
     while True:
+        if cpx.switch:
+            stream_stats.reset()
+            pixels.fill(CLEAR)
+            # closed explicitly, abandoned generators are never finalized
+            stream = stream_colors()
+            color = CLEAR
+            try:
+                for color in stream:
+                    print("({}, {}, {})".format(*color))
+                    if not cpx.switch:
+                        break
+            finally:
+                stream.close()
+            stream_stats.report()
+            pixels.fill(color)
+            pixels.show()
+
         if cpx.button_a or cpx.button_b:
-            verbose = cpx.button_b
             time.sleep(.05) # debounce
+            if cpx.button_a and cpx.button_b:
+                while cpx.button_a or cpx.button_b:
+                    time.sleep(.01)
+                calibrate()
+                continue
+            verbose = cpx.button_b
             if verbose:
                 print("button pressed")
             while cpx.button_a or cpx.button_b:
                 time.sleep(.01)
+            start = time.monotonic_ns()
             r, g, b = sense_color(verbose)
-            
-            print("({}, {}, {})".format(r, g, b))
-            cpx.pixels.fill((r, g, b))
+
+            print("({}, {}, {}) {}".format(r, g, b, classifier.classify((r, g, b))))
+            if verbose:
+                print("sensed in {} ms".format((time.monotonic_ns() - start) // 1000000))
+                settle_stats.report()
+                pixels.report()
+            pixels.fill((r, g, b))
+            pixels.show()
 
 
 except:
-    cpx.pixels.fill(CLEAR)
+    pixels.fill(CLEAR)
+    pixels.show()
@@ -0,0 +1,580 @@
+# Circuit Playground Express simulator
+# Author: David Boyd
+# License: MIT License (https://opensource.org/licenses/MIT)
+"""
+Stand-in for ``adafruit_circuitplayground.express`` and ``adafruit_hid``, so
+the example scripts can be run, checked and profiled on a desktop Python
+with no board attached.
+
+    python cpx_sim.py color_sense.py 10
+
+runs color_sense.py for 10 simulated seconds with its default input trace
+and prints what the board did.  From Python:
+
+    import cpx_sim
+    board = cpx_sim.run_script("simon_game.py", trace, until=60)
+    print(board.tones, board.pixels.pushes, board.mouse.reports)
+
+A trace is a list of (seconds, attribute, value) events applied to the
+board as the clock passes them, e.g. (0.5, "button_a", True) or
+(2.0, "acceleration", (3.0, 0.0, 9.8)).  Any board attribute can be
+scripted, including the surface under the light sensor.
+
+The clock is virtual by default: time.sleep() and play_tone() advance it
+instantly, and every sensor read costs READ_COST, so busy loops make
+progress too.  A session replays as fast as the host can run the script.
+With virtual=False the real clock is used and sleeps really sleep.
+
+The light sensor sees ambient light plus the color of pixel 1 reflected
+off ``surface`` (red, green and blue reflectance, 0 to 1), settling with
+time constant LIGHT_TAU after each change, which is enough for
+color_sense.py to sense and calibrate against.
+
+The accelerometer is a LIS3DH register map (data rate, range, FIFO in
+stream mode, burst reads) behind ``cpx._lis3dh._i2c``, where the real
+driver keeps its I2CDevice, for lis3dh_fifo.py.  It samples ``acceleration``
+plus ``tremor`` (gaussian noise, m/s^2 standard deviation) at the
+configured data rate.  Both it and ``cpx.acceleration`` count I2C
+transactions in ``board._lis3dh.transactions``.
+
+``touchio`` and ``board`` are simulated too, for scripts that read the
+touch pads' raw values themselves: TouchIn(board.A4).raw_value follows
+``touch_A4`` (TOUCH_IDLE, plus TOUCH_GAIN while touched, plus a little
+noise).
+"""
+import math
+import random
+import runpy
+import sys
+import time
+
+# virtual seconds charged for each sensor or button read
+READ_COST = 0.00002
+# seconds for the light sensor to settle 63% of the way after a change
+LIGHT_TAU = 0.004
+# light reading for a full brightness white pixel over a white surface
+LIGHT_GAIN = 0.3
+
+# touchio raw_value of an untouched pad, and how much a finger adds
+TOUCH_IDLE = 1800
+TOUCH_GAIN = 600
+
+_real_sleep = time.sleep
+_real_monotonic = time.monotonic
+_real_monotonic_ns = time.monotonic_ns
+
+
+class SimulationEnd(KeyboardInterrupt):
+    """
+    Raised into the script when the simulated session is over, so it
+    unwinds the way it would for ctrl-C.
+    """
+
+
+class Clock:
+    """
+    Virtual clock driving the board.  sleep() jumps ahead, applying any
+    trace events it passes.
+    """
+    def __init__(self, board, virtual=True, until=None):
+        self._board = board
+        self.virtual = virtual
+        self.until = until
+        self._now = 0.0
+        self._start = _real_monotonic()
+
+    def monotonic(self):
+        if self.virtual:
+            return self._now
+        return _real_monotonic() - self._start
+
+    def monotonic_ns(self):
+        return int(self.monotonic() * 1000000000)
+
+    def sleep(self, seconds):
+        if seconds < 0:
+            raise ValueError("sleep length must be non-negative")
+        if self.virtual:
+            self._now += seconds
+        else:
+            _real_sleep(seconds)
+        self._board._tick()
+
+    def charge(self, seconds):
+        if self.virtual:
+            self._now += seconds
+        self._board._tick()
+
+
+class Pixels:
+    """
+    NeoPixel strip.  pushes counts the times the strip would have been
+    written, with auto_write on that is every change.
+    """
+    def __init__(self, n=10):
+        self._colors = [(0, 0, 0)] * n
+        self._shown = list(self._colors)
+        self._brightness = 1.0
+        self._shown_brightness = 1.0
+        self.auto_write = True
+        self.pushes = 0
+
+    def __len__(self):
+        return len(self._colors)
+
+    def __getitem__(self, index):
+        return self._colors[index]
+
+    def __setitem__(self, index, color):
+        self._colors[index] = tuple(color)
+        if self.auto_write:
+            self.show()
+
+    def fill(self, color):
+        for i in range(len(self._colors)):
+            self._colors[i] = tuple(color)
+        if self.auto_write:
+            self.show()
+
+    @property
+    def brightness(self):
+        return self._brightness
+
+    @brightness.setter
+    def brightness(self, brightness):
+        self._brightness = min(max(brightness, 0.0), 1.0)
+        if self.auto_write:
+            self.show()
+
+    def show(self):
+        self._board_light_change()
+        self._shown = list(self._colors)
+        self._shown_brightness = self._brightness
+        self.pushes += 1
+
+    def shown(self, index):
+        """
+        Color pixel index is actually showing, brightness applied.
+        """
+        b = self._shown_brightness
+        return tuple(int(c * b) for c in self._shown[index])
+
+    def _board_light_change(self):
+        # set by Board to track the light sensor
+        pass
+
+
+class Mouse:
+    """
+    adafruit_hid.mouse.Mouse that records reports instead of sending them.
+    Each report is (seconds, buttons, x, y, wheel).
+    """
+    LEFT_BUTTON = 1
+    RIGHT_BUTTON = 2
+    MIDDLE_BUTTON = 4
+
+    def __init__(self, *devices):
+        self._board = _board
+        # like the real one, report[0] is the button state move() sends
+        self.report = bytearray(4)
+        self.reports = []
+        _board.mouse = self
+
+    def _report(self, x=0, y=0, wheel=0):
+        self.reports.append((self._board.clock.monotonic(), self.report[0], x, y, wheel))
+
+    def press(self, buttons):
+        self.report[0] |= buttons
+        self._report()
+
+    def release(self, buttons):
+        self.report[0] &= ~buttons & 0xFF
+        self._report()
+
+    def release_all(self):
+        self.report[0] = 0
+        self._report()
+
+    def click(self, buttons):
+        self.press(buttons)
+        self.release(buttons)
+
+    def move(self, x=0, y=0, wheel=0):
+        # the report fields are signed bytes, big moves take several reports
+        while x or y or wheel:
+            dx = min(max(x, -127), 127)
+            dy = min(max(y, -127), 127)
+            dw = min(max(wheel, -127), 127)
+            self._report(dx, dy, dw)
+            x -= dx
+            y -= dy
+            wheel -= dw
+
+
+_LIS3DH_RATES = (0, 1, 10, 25, 50, 100, 200, 400, 1600, 1344)
+_LIS3DH_DIVIDERS = (16380, 8190, 4096, 1365)
+_STANDARD_GRAVITY = 9.806
+
+
+class LIS3DH:
+    """
+    LIS3DH register map, set up the way adafruit_circuitplayground leaves
+    it (400 Hz, high resolution, +-8 g).  It is its own I2CDevice.
+    """
+    def __init__(self, board, seed=1):
+        self._board = board
+        self._i2c = self
+        self._random = random.Random(seed)
+        self.registers = bytearray(0x40)
+        self.registers[0x0F] = 0x33     # WHO_AM_I
+        self.registers[0x20] = 0x77     # CTRL_REG1: 400 Hz, x y z on
+        self.registers[0x23] = 0xA8     # CTRL_REG4: BDU, 8 g, high resolution
+        self.fifo = []
+        self.transactions = 0
+        self._sampled_at = 0.0
+        self._sample = (0, 0, 0)
+
+    def _fifo_on(self):
+        return self.registers[0x24] & 0x40 and self.registers[0x2E] & 0xC0
+
+    def _divider(self):
+        return _LIS3DH_DIVIDERS[(self.registers[0x23] >> 4) & 3]
+
+    def _measure(self):
+        scale = self._divider() / _STANDARD_GRAVITY
+        tremor = self._board.tremor
+        sample = []
+        for a in self._board._acceleration:
+            if tremor:
+                a += self._random.gauss(0.0, tremor)
+            sample.append(min(max(int(a * scale), -32768), 32767))
+        return tuple(sample)
+
+    def _update(self):
+        now = self._board.clock.monotonic()
+        rate = _LIS3DH_RATES[self.registers[0x20] >> 4]
+        if not rate:
+            return
+        count = int((now - self._sampled_at) * rate)
+        if not count:
+            return
+        self._sampled_at += count / rate
+        fifo_on = self._fifo_on()
+        for _ in range(min(count, 33)):
+            self._sample = self._measure()
+            if fifo_on:
+                self.fifo.append(self._sample)
+        del self.fifo[:-32]
+
+    def read_acceleration(self):
+        """
+        What a plain cpx.acceleration read returns: the latest sample.
+        """
+        self._update()
+        self.transactions += 1
+        divider = self._divider()
+        return tuple(v / divider * _STANDARD_GRAVITY for v in self._sample)
+
+    def _read_byte(self, register):
+        if register == 0x2F:            # FIFO_SRC
+            count = len(self.fifo)
+            return (0x40 if count >= 32 else 0) | (0x20 if not count else 0) | min(count, 31)
+        if 0x28 <= register <= 0x2D:
+            sample = self.fifo[0] if self._fifo_on() and self.fifo else self._sample
+            value = sample[(register - 0x28) >> 1] & 0xFFFF
+            return value >> 8 if register & 1 else value & 0xFF
+        return self.registers[register]
+
+    # I2CDevice
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def write(self, buf, start=0, end=None):
+        data = bytes(memoryview(buf)[start:end])
+        self.transactions += 1
+        register = data[0] & 0x7F
+        for value in data[1:]:
+            self.registers[register] = value
+            if register == 0x2E and not value & 0xC0:
+                self.fifo.clear()   # bypass mode empties the FIFO
+            if data[0] & 0x80:
+                register += 1
+
+    def write_then_readinto(self, out_buffer, in_buffer, out_start=0, out_end=None,
+                            in_start=0, in_end=None):
+        self._update()
+        self.transactions += 1
+        address = memoryview(out_buffer)[out_start:out_end][0]
+        register = address & 0x7F
+        into = memoryview(in_buffer)[in_start:in_end].cast('B')
+        fifo_on = self._fifo_on()
+        for i in range(len(into)):
+            into[i] = self._read_byte(register)
+            if address & 0x80:
+                if register == 0x2D and fifo_on:
+                    # the sample is read out, the next one follows
+                    if self.fifo:
+                        del self.fifo[0]
+                    register = 0x28
+                else:
+                    register += 1
+
+
+class Board:
+    """
+    The simulated cpx object.
+    """
+    _INPUTS = ("button_a", "button_b", "switch", "touch_A1", "touch_A2",
+               "touch_A3", "touch_A4", "touch_A5", "touch_A6", "touch_A7")
+
+    def __init__(self, trace=(), virtual=True, until=None):
+        self.clock = Clock(self, virtual, until)
+        self.pixels = Pixels()
+        self.pixels._board_light_change = self._light_change
+        self.mouse = None
+        self.tones = []
+        self.red_led = False
+        self.temperature = 22.0
+        self._lis3dh = LIS3DH(self)
+        self._acceleration = (0.0, 0.0, 9.8)
+        self.tremor = 0.0
+        self._touch_noise = random.Random(2)
+        self.ambient = 10
+        self.surface = (0.5, 0.5, 0.5)
+        self.reads = 0
+        self._state = {name: False for name in self._INPUTS}
+        self._state["switch"] = True
+        self._trace = sorted(trace, key=lambda event: event[0])
+        self._next = 0
+        self._light = float(self.ambient)
+        self._light_target = float(self.ambient)
+        self._light_at = 0.0
+        self._tone = None
+        self._tick()
+
+    def _tick(self):
+        now = self.clock.monotonic()
+        trace = self._trace
+        while self._next < len(trace) and trace[self._next][0] <= now:
+            _, name, value = trace[self._next]
+            self._next += 1
+            setattr(self, name, value)
+            if name in ("surface", "ambient"):
+                self._light_change()
+        if self.clock.until is not None and now >= self.clock.until:
+            raise SimulationEnd()
+
+    def _read(self, name):
+        self.reads += 1
+        self.clock.charge(READ_COST)
+        return self._state[name]
+
+    def __getattr__(self, name):
+        # only called for attributes not found normally: the inputs
+        if name in Board._INPUTS:
+            return self._read(name)
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if name in Board._INPUTS:
+            self._state[name] = value
+        else:
+            object.__setattr__(self, name, value)
+
+    @property
+    def acceleration(self):
+        self.reads += 1
+        self.clock.charge(READ_COST)
+        return self._lis3dh.read_acceleration()
+
+    @acceleration.setter
+    def acceleration(self, acceleration):
+        self._acceleration = tuple(acceleration)
+
+    # light sensor
+
+    def _settled_light(self):
+        if self._light_target is None:
+            r, g, b = self.pixels.shown(1)
+            sr, sg, sb = self.surface
+            self._light_target = self.ambient + LIGHT_GAIN * (r * sr + g * sg + b * sb)
+        now = self.clock.monotonic()
+        return self._light_target + (self._light - self._light_target) * math.exp(
+            -(now - self._light_at) / LIGHT_TAU)
+
+    def _light_change(self):
+        # called just before the strip changes, the level so far is kept and
+        # the new target worked out on the next read
+        self._light = self._settled_light()
+        self._light_at = self.clock.monotonic()
+        self._light_target = None
+
+    @property
+    def light(self):
+        self.reads += 1
+        self.clock.charge(READ_COST)
+        return min(max(int(self._settled_light()), 0), 329)
+
+    # sound
+
+    def play_tone(self, frequency, duration):
+        self.tones.append((self.clock.monotonic(), frequency, duration))
+        self.clock.sleep(duration)
+
+    def start_tone(self, frequency):
+        self.stop_tone()
+        self._tone = (self.clock.monotonic(), frequency)
+
+    def stop_tone(self):
+        if self._tone is not None:
+            start, frequency = self._tone
+            self.tones.append((start, frequency, self.clock.monotonic() - start))
+            self._tone = None
+
+    def report(self):
+        print("simulated {:.2f}s: reads={} pixel pushes={} tones={} mouse reports={}".format(
+            self.clock.monotonic(), self.reads, self.pixels.pushes, len(self.tones),
+            len(self.mouse.reports) if self.mouse else 0))
+
+
+class TouchIn:
+    """
+    touchio.TouchIn on a simulated pad.
+    """
+    def __init__(self, pin):
+        self._name = "touch_" + pin
+        self._board = _board
+        self.threshold = TOUCH_IDLE + 100
+
+    @property
+    def raw_value(self):
+        board = self._board
+        touched = board._read(self._name)
+        return TOUCH_IDLE + (TOUCH_GAIN if touched else 0) + board._touch_noise.randrange(-20, 21)
+
+    @property
+    def value(self):
+        return self.raw_value > self.threshold
+
+    def deinit(self):
+        pass
+
+
+_board = None
+
+
+def install(trace=(), virtual=True, until=None):
+    """
+    Register the simulated modules with a fresh board and return it.  With
+    the virtual clock, time.sleep and time.monotonic(_ns) follow the board
+    until uninstall().
+    """
+    global _board
+    _board = Board(trace, virtual, until)
+
+    express = type(sys)("adafruit_circuitplayground.express")
+    express.cpx = _board
+    package = type(sys)("adafruit_circuitplayground")
+    package.express = express
+    sys.modules["adafruit_circuitplayground"] = package
+    sys.modules["adafruit_circuitplayground.express"] = express
+
+    mouse = type(sys)("adafruit_hid.mouse")
+    mouse.Mouse = Mouse
+    hid = type(sys)("adafruit_hid")
+    hid.mouse = mouse
+    sys.modules["adafruit_hid"] = hid
+    sys.modules["adafruit_hid.mouse"] = mouse
+
+    touchio = type(sys)("touchio")
+    touchio.TouchIn = TouchIn
+    sys.modules["touchio"] = touchio
+    board_module = type(sys)("board")
+    for i in range(1, 8):
+        setattr(board_module, "A{}".format(i), "A{}".format(i))
+    sys.modules["board"] = board_module
+
+    if "micropython" not in sys.modules:
+        micropython = type(sys)("micropython")
+        micropython.const = lambda value: value
+        sys.modules["micropython"] = micropython
+
+    if virtual:
+        time.sleep = _board.clock.sleep
+        time.monotonic = _board.clock.monotonic
+        time.monotonic_ns = _board.clock.monotonic_ns
+    return _board
+
+
+def uninstall():
+    """
+    Put the real clock back.
+    """
+    time.sleep = _real_sleep
+    time.monotonic = _real_monotonic
+    time.monotonic_ns = _real_monotonic_ns
+
+
+def run_script(path, trace=(), until=10.0, virtual=True):
+    """
+    Run a script against a fresh board until it finishes or the clock
+    reaches until seconds, and return the board.
+    """
+    board = install(trace, virtual, until)
+    # scripts import each other's helpers (pixel_frame, color_classify);
+    # drop them so each run starts from a fresh cpx
+    for name in ("pixel_frame", "color_classify"):
+        sys.modules.pop(name, None)
+    try:
+        runpy.run_path(path, run_name="__main__")
+    except SimulationEnd:
+        pass
+    finally:
+        uninstall()
+    return board
+
+
+# Input traces that exercise each script.
+TRACES = {
+    "color_sense.py": [
+        (0.0, "switch", False),
+        (0.5, "button_a", True), (0.6, "button_a", False),
+        (1.5, "surface", (0.9, 0.2, 0.1)),
+        (2.0, "button_b", True), (2.1, "button_b", False),
+        (3.0, "switch", True), (3.0, "surface", (0.1, 0.3, 0.9)),
+        (5.0, "switch", False),
+    ],
+    "accel_mouse.py": [
+        (0.5, "acceleration", (3.0, 0.0, 9.0)),
+        (1.0, "acceleration", (-6.0, 2.0, 7.0)),
+        (1.5, "button_a", True), (1.6, "button_a", False),
+        (2.0, "acceleration", (0.0, 0.0, 9.8)),
+        (2.5, "button_b", True), (2.7, "button_b", False),
+    ],
+    "simon_game.py": [
+        (4.0, "button_b", True), (4.2, "button_b", False),
+        (8.0, "touch_A4", True), (8.3, "touch_A4", False),
+        (12.0, "touch_A6", True), (13.5, "touch_A6", False),
+    ],
+    "star_wars_piezo.py": [],
+}
+
+
+def main():
+    path = sys.argv[1]
+    until = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    start = _real_monotonic()
+    board = run_script(path, TRACES.get(path.rsplit("/", 1)[-1], ()), until)
+    wall = _real_monotonic() - start
+    print()
+    board.report()
+    print("wall {:.3f}s, {:.0f}x real time".format(
+        wall, board.clock.monotonic() / wall if wall else 0))
+
+
+if __name__ == "__main__":
+    main()
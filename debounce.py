@@ -0,0 +1,99 @@
+# Non-blocking button debouncer for Circuit Playground Express
+# Author: David Boyd
+# License: MIT License (https://opensource.org/licenses/MIT)
+"""
+Debounces buttons (or any inputs that read as True/False) without sleeping
+and queues their press and release events.
+
+    buttons = Debouncer((lambda: cpx.button_a, lambda: cpx.button_b))
+    while True:
+        buttons.poll()
+        event = buttons.get()
+        while event is not None:
+            index, pressed, at_ns = event
+            ...
+            event = buttons.get()
+
+poll() as often as convenient, it only reads the inputs.  An edge is
+reported on the first poll that sees it, stamped with that poll's
+monotonic_ns(), and the input then ignores changes for lockout_ms so
+contact bounce can't produce more events.  A click shorter than the lockout
+is still reported, the release just comes out when the lockout ends.
+
+The queue is preallocated; if it fills, further events are dropped and
+counted in dropped.
+"""
+import array
+import time
+
+DEBOUNCE_MS = 20
+
+
+class Debouncer:
+
+    def __init__(self, inputs, lockout_ms=DEBOUNCE_MS, queue_size=16):
+        """
+        inputs is a sequence of functions returning the raw state of each
+        input, the event index is the position in it.
+        """
+        n = len(inputs)
+        self._inputs = inputs
+        self._lockout_ns = lockout_ms * 1000000
+        self._state = bytearray(1 if read() else 0 for read in inputs)
+        now = time.monotonic_ns()
+        self._edge_ns = array.array('Q', [now] * n)
+        # event queue, a ring of (input, pressed, timestamp)
+        self._queue_input = bytearray(queue_size)
+        self._queue_pressed = bytearray(queue_size)
+        self._queue_ns = array.array('Q', [0] * queue_size)
+        self._head = 0
+        self._count = 0
+        self.polls = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self._count
+
+    def pressed(self, index):
+        """
+        Debounced state of input index.
+        """
+        return bool(self._state[index])
+
+    def poll(self):
+        """
+        Read every input and queue any new edges.
+        """
+        now = time.monotonic_ns()
+        self.polls += 1
+        state = self._state
+        for i in range(len(state)):
+            raw = 1 if self._inputs[i]() else 0
+            if raw != state[i] and now - self._edge_ns[i] >= self._lockout_ns:
+                state[i] = raw
+                self._edge_ns[i] = now
+                self._put(i, raw, now)
+
+    def _put(self, index, pressed, now):
+        size = len(self._queue_ns)
+        if self._count == size:
+            self.dropped += 1
+            return
+        tail = (self._head + self._count) % size
+        self._queue_input[tail] = index
+        self._queue_pressed[tail] = pressed
+        self._queue_ns[tail] = now
+        self._count += 1
+
+    def get(self):
+        """
+        Return the oldest event as (index, pressed, monotonic_ns), or None.
+        """
+        if not self._count:
+            return None
+        head = self._head
+        event = (self._queue_input[head], bool(self._queue_pressed[head]),
+                 self._queue_ns[head])
+        self._head = (head + 1) % len(self._queue_ns)
+        self._count -= 1
+        return event
@@ -39,6 +39,7 @@ sure that the input pin is 5v tolerant.
 import time
 import array
 import digitalio
+from micropython import const
 
 # Register names.
 DS1302_ENABLE            = const(0x8E)
@@ -47,34 +48,568 @@ DS1302_CLOCK_BURST_WRITE = const(0xBE)
 DS1302_CLOCK_BURST_READ  = const(0xBF)
 DS1302_RAM_BURST_WRITE   = const(0xFE)
 DS1302_RAM_BURST_READ    = const(0xFF)
+DS1302_RAM_WRITE         = const(0xC0)
+
+# Transaction types, used to index the per-transaction setup/hold times.
+TX_REGISTER    = const(0)
+TX_CLOCK_READ  = const(1)
+TX_CLOCK_WRITE = const(2)
+TX_RAM_READ    = const(3)
+TX_RAM_WRITE   = const(4)
+_TX_COUNT      = const(5)
+
+# Delays shorter than this are busy-waited on monotonic_ns, longer ones sleep.
+_SPIN_LIMIT_NS = const(1000000)
+
+# Rough cost of CE framing and setup/hold, in byte times, used by DS1302RAM
+# to choose between single register writes and a burst.
+_TX_COST_BYTES = const(2)
+
+# The cached clock never resyncs more often than this, however bad the drift.
+_CACHE_MIN_RESYNC_NS = const(1000000000)
+
+# BCD lookup tables: _BCD_DECODE maps any register byte (after masking off
+# the control bits) to its value, _BCD_ENCODE maps 0..99 to BCD.
+_BCD_DECODE = bytes((b >> 4) * 10 + (b & 0x0F) for b in range(256))
+_BCD_ENCODE = bytes((v // 10) << 4 | v % 10 for v in range(100))
+
+# Cumulative day counts for the chip's 2000..2099 range, where every
+# fourth year, 2000 included, is a leap year.  Index the month table by
+# month (1..12) and add a day after February in leap years.
+_DAYS_BEFORE_MONTH = array.array('H', (0, 0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334))
+_DAYS_BEFORE_YEAR = array.array('H', (y * 365 + (y + 3) // 4 for y in range(101)))
+
+# Seconds from 1970-01-01 (time.time() epoch) to 2000-01-01, and to the
+# end of the chip's range, 2100-01-01.
+_EPOCH_2000 = const(946684800)
+_EPOCH_2100 = const(4102444800)
+
+
+def _delay_ns(ns):
+    """
+    Wait for ns nanoseconds.  Short waits spin, long waits sleep.
+    """
+    if ns <= 0:
+        return
+    if ns >= _SPIN_LIMIT_NS:
+        time.sleep(ns / 1000000000)
+        return
+    end = time.monotonic_ns() + ns
+    while time.monotonic_ns() < end:
+        pass
+
+
+def _days_since_2000(year, month, mday):
+    """
+    Day number of a date, year counted from 2000.
+    """
+    days = _DAYS_BEFORE_YEAR[year] + _DAYS_BEFORE_MONTH[month] + mday - 1
+    if month > 2 and not year & 3:
+        days += 1
+    return days
+
+
+def _check_date(year, month, mday):
+    """
+    Raise OSError unless the decoded date registers are in range.  A chip
+    that is missing or not driving IO reads as all 0xFF.
+    """
+    if year > 99 or not 1 <= month <= 12 or not 1 <= mday <= 31:
+        raise OSError("invalid clock registers")
+
+
+def _epoch_from_bcd(buf):
+    """
+    Seconds since 1970 from the seven clock registers.
+    """
+    dec = _BCD_DECODE
+    year = dec[buf[6]]
+    month = dec[buf[4] & 0x1F]
+    mday = dec[buf[3] & 0x3F]
+    _check_date(year, month, mday)
+    days = _days_since_2000(year, month, mday)
+    return (_EPOCH_2000 + days * 86400 + dec[buf[2] & 0x3F] * 3600
+            + dec[buf[1] & 0x7F] * 60 + dec[buf[0] & 0x7F])
+
+
+def _split_bcd(buf):
+    """
+    Decode the seven clock registers into
+    (year, month, mday, hour, minute, second, wday, yday).
+    """
+    dec = _BCD_DECODE
+    day = dec[buf[3] & 0x3F]
+    month = dec[buf[4] & 0x1F]
+    year = dec[buf[6]]
+    _check_date(year, month, day)
+    # the day register is user defined, so derive the weekday from the date
+    days = _days_since_2000(year, month, day)
+    return (year + 2000, month, day, dec[buf[2] & 0x3F], dec[buf[1] & 0x7F],
+            dec[buf[0] & 0x7F], (days + 5) % 7, days - _DAYS_BEFORE_YEAR[year] + 1)
+
+
+def _bcd_from_datetime(dt, buf):
+    """
+    Fill buf[0:7] with clock registers for a struct_time.
+    """
+    if not 2000 <= dt.tm_year <= 2099:
+        raise ValueError("2000..2099 only")
+    enc = _BCD_ENCODE
+    buf[0] = enc[dt.tm_sec]
+    buf[1] = enc[dt.tm_min]
+    buf[2] = enc[dt.tm_hour]
+    buf[3] = enc[dt.tm_mday]
+    buf[4] = enc[dt.tm_mon]
+    buf[5] = dt.tm_wday + 1
+    buf[6] = enc[dt.tm_year - 2000]
+
+
+def _ram_span(buf, start, length):
+    """
+    Number of RAM bytes to transfer for buf from address start.
+    """
+    if not 0 <= start < 31:
+        raise ValueError("RAM address out of range")
+    if length is None:
+        length = len(buf)
+    return min(length, len(buf), 31 - start)
+
+
+def _split_epoch(secs):
+    """
+    Split seconds since 1970 into
+    (year, month, mday, hour, minute, second, wday, yday), 2000..2099 only.
+    """
+    days, secs = divmod(secs - _EPOCH_2000, 86400)
+    # four year cycles of 1461 days, starting with a leap year
+    year = days * 4 // 1461
+    yday = days - _DAYS_BEFORE_YEAR[year]
+    leap = not year & 3
+    month = 12
+    while yday < _DAYS_BEFORE_MONTH[month] + (leap and month > 2):
+        month -= 1
+    mday = yday - _DAYS_BEFORE_MONTH[month] - (leap and month > 2) + 1
+    # 2000-01-01 was a Saturday, tm_wday counts from Monday = 0
+    return (year + 2000, month, mday, secs // 3600, secs // 60 % 60, secs % 60,
+            (days + 5) % 7, yday + 1)
+
+
+def _bcd_from_epoch(secs, buf):
+    """
+    Fill buf[0:7] with clock registers for seconds since 1970.
+    """
+    if not _EPOCH_2000 <= secs < _EPOCH_2100:
+        raise ValueError("2000..2099 only")
+    year, month, mday, hour, minute, second, wday, _ = _split_epoch(secs)
+    enc = _BCD_ENCODE
+    buf[0] = enc[second]
+    buf[1] = enc[minute]
+    buf[2] = enc[hour]
+    buf[3] = enc[mday]
+    buf[4] = enc[month]
+    buf[5] = wday + 1
+    buf[6] = enc[year - 2000]
+
+
+class DS1302Timing:
+    """
+    Bus timing profile, all values in nanoseconds.
+
+    clk_ns is the SCLK half period used for every bit.  setup_ns is the time
+    between raising CE and the first clock edge, hold_ns is the time CE stays
+    low after a transaction.  Both may be a single value or a sequence with
+    one entry per transaction type (TX_REGISTER .. TX_RAM_WRITE).
+    """
+    def __init__(self, name, clk_ns, setup_ns, hold_ns):
+        self.name = name
+        self.clk_ns = int(clk_ns)
+        self.setup_ns = self._per_tx(setup_ns)
+        self.hold_ns = self._per_tx(hold_ns)
+
+    @staticmethod
+    def _per_tx(value):
+        if isinstance(value, (int, float)):
+            return tuple([int(value)] * _TX_COUNT)
+        if len(value) != _TX_COUNT:
+            raise ValueError("expected {} per-transaction values".format(_TX_COUNT))
+        return tuple(int(v) for v in value)
+
+    def __repr__(self):
+        return "DS1302Timing({!r}, clk_ns={}, setup_ns={}, hold_ns={})".format(
+            self.name, self.clk_ns, self.setup_ns, self.hold_ns)
+
+
+# Datasheet minimums at Vcc = 2.0V (the slowest grade): tCL/tCH 1000ns,
+# tCC (CE to CLK setup) 4us, tCWH (CE inactive time) 4us.  The interpreter
+# overhead per pin write is already larger than the clock half period, so
+# the per-bit delay is dropped entirely.
+TIMING_DATASHEET_MIN = DS1302Timing("datasheet-minimum", 0, 4000, 4000)
+
+# Comfortable margins for long wires and breadboards.  Burst writes get a
+# longer hold so the chip has finished latching before the next access.
+TIMING_CONSERVATIVE = DS1302Timing(
+    "conservative", 10000,
+    (50000, 50000, 50000, 50000, 50000),
+    (50000, 50000, 200000, 50000, 200000))
+
+TIMING_PROFILES = {
+    TIMING_DATASHEET_MIN.name: TIMING_DATASHEET_MIN,
+    TIMING_CONSERVATIVE.name: TIMING_CONSERVATIVE,
+}
+
+
+class BitBangTransport:
+    """
+    Drives the 3-wire bus from Python, one pin write per clock edge.
+
+    A transport moves bytes while CE is raised; DS1302RTC handles the CE
+    setup/hold timing.  The interface is select(), try_select(),
+    deselect(), clock_in(command, buf, skip, count),
+    clock_out(command, buf, count) and set_timing(profile).  ce, io and
+    sclk are DigitalInOut (or compatible) objects.
+
+    BUS_LOCK is True for transports whose select() takes a lock on a bus
+    other devices may share, held until deselect().  try_select() returns
+    False instead of waiting for it.
+    """
+    # pin writes per byte sent, per byte received and per transaction, and
+    # clock half periods waited per byte; used by ds1302_stats
+    PIN_WRITES = (24, 16, 3)
+    CLK_WAITS = 16
+    BUS_LOCK = False
+
+    def __init__(self, ce, io, sclk):
+        # DigitalInOut starts as an input; _io_is_output tracks the IO pin
+        # direction so it is only switched when it has to change
+        self._io = io
+        self._io_is_output = False
+
+        self._sclk = sclk
+        self._sclk.direction = digitalio.Direction.OUTPUT
+        self._sclk.value = False
+
+        self._ce = ce
+        self._ce.direction = digitalio.Direction.OUTPUT
+
+        self._clk_ns = 0
+
+    def set_timing(self, profile):
+        self._clk_ns = profile.clk_ns
+
+    def select(self):
+        """
+        Raise CE.  SCLK is already low, deselect() and __init__ leave it
+        there.
+        """
+        self._ce.value = True
+
+    def try_select(self):
+        self.select()
+        return True
+
+    def deselect(self):
+        """
+        Drop SCLK and CE.  The IO pin keeps its direction, the chip only
+        drives it during a read with CE high.
+        """
+        self._sclk.value = False
+        self._ce.value = False
+
+    def write_byte(self, byte):
+        """
+        Write byte to the chip.
+        """
+        # data pin is now output
+        if not self._io_is_output:
+            self._io.switch_to_output()
+            self._io_is_output = True
+
+        sclk = self._sclk
+        io = self._io
+        clk_ns = self._clk_ns
+        # clock the byte to chip
+        for _ in range(8):
+            sclk.value = False
+            if clk_ns:
+                _delay_ns(clk_ns)
+
+            # chip read data on clk rising edge
+            io.value = (byte & 0x01)
+            byte >>= 1
+            sclk.value = True
+
+            if clk_ns:
+                _delay_ns(clk_ns)
+
+    def read_byte(self):
+        """
+        Read byte from the chip.
+        """
+        # data pin is now input (pull-down resistor embedded in chip)
+        if self._io_is_output:
+            self._io.switch_to_input()
+            self._io_is_output = False
+
+        sclk = self._sclk
+        io = self._io
+        clk_ns = self._clk_ns
+        # clock the byte from chip
+        byte = 0
+        for i in range(8):
+            # make a high pulse on CLK pin
+            sclk.value = True
+            if clk_ns:
+                _delay_ns(clk_ns)
+
+            sclk.value = False
+            if clk_ns:
+                _delay_ns(clk_ns)
+            # chip out data on clk falling edge: store current bit into byte
+            if io.value:
+                byte |= 1 << i
+
+        return byte
+
+    def clock_in(self, command, buf, skip, count):
+        """
+        Send command, drop skip bytes, then read count bytes into buf.
+        """
+        self.write_byte(command)
+
+        read_byte = self.read_byte
+        for _ in range(skip):
+            read_byte()
+        for i in range(count):
+            buf[i] = read_byte()
+
+    def clock_out(self, command, buf, count):
+        """
+        Send command followed by buf[0:count].
+        """
+        self.write_byte(command)
+
+        write_byte = self.write_byte
+        for i in range(count):
+            write_byte(buf[i])
+
+
+# Bit order reversal, for SPI controllers that can only shift MSB first.
+_REVERSE = bytes(sum(((b >> i) & 1) << (7 - i) for i in range(8)) for b in range(256))
+
+
+class SPITransport:
+    """
+    Runs the bus on a hardware SPI peripheral, so a whole burst goes out in
+    one call.
+
+    The DS1302 has a single bidirectional IO line: wire MOSI to IO through a
+    1k resistor and MISO straight to IO.  SPI mode 0 matches the chip (it
+    latches on rising edges and shifts out on falling ones).  busio.SPI
+    shifts MSB first, so bytes are bit-reversed through a table.  CE is an
+    active-high chip select on any DigitalInOut.  Run baudrate at 500kHz
+    or less at 2V, up to 2MHz at 5V.
+
+    The SPI bus is locked from select() to deselect(), so it can be shared
+    with other devices.
+    """
+    PIN_WRITES = (0, 0, 2)
+    CLK_WAITS = 0
+    BUS_LOCK = True
+
+    def __init__(self, spi, ce, baudrate=500000):
+        self._spi = spi
+        self._ce = ce
+        self._ce.direction = digitalio.Direction.OUTPUT
+        self._ce.value = False
+        self.baudrate = baudrate
+        # command byte plus a full RAM burst
+        self._buf = bytearray(32)
+
+    def set_timing(self, profile):
+        # the bit clock is set by baudrate
+        pass
+
+    def select(self):
+        while not self.try_select():
+            pass
+
+    def try_select(self):
+        spi = self._spi
+        if not spi.try_lock():
+            return False
+        spi.configure(baudrate=self.baudrate, polarity=0, phase=0)
+        self._ce.value = True
+        return True
+
+    def deselect(self):
+        self._ce.value = False
+        self._spi.unlock()
+
+    def clock_in(self, command, buf, skip, count):
+        """
+        Send command, drop skip bytes, then read count bytes into buf.
+        """
+        rev = _REVERSE
+        scratch = self._buf
+        scratch[0] = rev[command]
+        self._spi.write(scratch, end=1)
+        end = skip + count
+        self._spi.readinto(scratch, end=end)
+        for i in range(count):
+            buf[i] = rev[scratch[skip + i]]
+
+    def clock_out(self, command, buf, count):
+        """
+        Send command followed by buf[0:count].
+        """
+        rev = _REVERSE
+        scratch = self._buf
+        scratch[0] = rev[command]
+        for i in range(count):
+            scratch[i + 1] = rev[buf[i]]
+        self._spi.write(scratch, end=count + 1)
+
 
 class DS1302RTC:
-    # 5us
-    CLK_DELAY = .005
 
-    def __init__(self, ce_pin, data_pin, sclk_pin):
+    def __init__(self, ce_pin=None, data_pin=None, sclk_pin=None,
+                 timing=TIMING_CONSERVATIVE, transport=None):
         """
         Driver for a DS 1302 RTC
+
+        timing is a DS1302Timing or the name of one in TIMING_PROFILES.
+        The chip is bit-banged on the three pins unless another transport
+        (SPITransport, ds1302_gpiod.GpiodTransport) is given, in which case
+        the pins are not used.
         """
-        self._IO_PIN = digitalio.DigitalInOut(data_pin)
-        
-        self._SCLK_PIN = digitalio.DigitalInOut(sclk_pin)
-        self._SCLK_PIN.direction = digitalio.Direction.OUTPUT
+        # scratch buffers for clock bursts; a burst write must send all
+        # eight registers, the last one (control) keeps write protect off
+        self._clock_buf = bytearray(7)
+        self._clock_wbuf = bytearray(8)
+        self._reg_buf = bytearray(1)
+
+        # DS1302Stats while instrumented, see instrument()
+        self.stats = None
+
+        # cached clock, see enable_cache()
+        self._cache_interval_ns = 0
+        self._cache_base = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_resyncs = 0
+        self.cache_drift = 0
+
+        if transport is None:
+            transport = BitBangTransport(
+                digitalio.DigitalInOut(ce_pin),
+                digitalio.DigitalInOut(data_pin),
+                digitalio.DigitalInOut(sclk_pin))
+        self._transport = transport
+        self.timing = timing
+
+        buf = self._reg_buf
+        buf[0] = 0x00
+        # turn off WP (write protect)
+        self._write_burst(DS1302_ENABLE, TX_REGISTER, buf, 1)
+        # charge mode is disabled
+        self._write_burst(DS1302_TRICKLE, TX_REGISTER, buf, 1)
 
-        self._CE_PIN = digitalio.DigitalInOut(ce_pin)
-        self._CE_PIN.direction = digitalio.Direction.OUTPUT
+    @property
+    def timing(self):
+        """
+        The active DS1302Timing profile.
+        """
+        return self._timing
 
-        # turn off WP (write protect)
-        self._start_tx()
-        self._write_byte(DS1302_ENABLE)
-        self._write_byte(0x00)
-        self._end_tx()
+    @timing.setter
+    def timing(self, profile):
+        if isinstance(profile, str):
+            profile = TIMING_PROFILES[profile]
+        self._timing = profile
+        self._transport.set_timing(profile)
 
-        # charge mode is disabled
-        self._start_tx()
-        self._write_byte(DS1302_TRICKLE)
-        self._write_byte(0x00)
-        self._end_tx()
+    def instrument(self, enable=True):
+        """
+        Switch per-method statistics on or off and return the
+        ds1302_stats.DS1302Stats collecting them (None when off).
+
+        When off nothing is hooked in and the driver runs at full speed.
+        """
+        import ds1302_stats
+        if enable:
+            return ds1302_stats.attach(self)
+        ds1302_stats.detach(self)
+        return None
+
+    def enable_cache(self, resync_s=60, drift_limit_s=1):
+        """
+        Answer read_datetime() from the MCU clock between bus reads.
+
+        One burst read anchors the RTC time to time.monotonic_ns(), later
+        calls add the elapsed time to that anchor.  The RTC is read again
+        after resync_s seconds.  If a resync finds the two clocks have
+        drifted apart by more than drift_limit_s seconds the interval is
+        halved, once they agree again it goes back to resync_s.
+
+        The cached time is only as precise as one RTC tick (1 second).
+        """
+        self._cache_interval_ns = int(resync_s * 1000000000)
+        self._cache_resync_ns = self._cache_interval_ns
+        self._cache_drift_limit = drift_limit_s
+        self._cache_base = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_resyncs = 0
+        self.cache_drift = 0
+
+    def disable_cache(self):
+        """
+        Read the RTC on every read_datetime() call again.
+        """
+        self._cache_interval_ns = 0
+        self._cache_base = None
+
+    def _cached_epoch(self):
+        """
+        read_epoch() when the cache is enabled.
+        """
+        now = time.monotonic_ns()
+        secs = self._cache_lookup(now)
+        if secs is None:
+            buf = self._clock_buf
+            self._read_clock(buf)
+            secs = _epoch_from_bcd(buf)
+            self._cache_update(secs, now)
+        return secs
+
+    def _cache_lookup(self, now):
+        """
+        Cached time at monotonic_ns() now, or None if the RTC must be read.
+        """
+        base = self._cache_base
+        if base is not None:
+            elapsed = now - self._cache_synced_ns
+            if elapsed < self._cache_resync_ns:
+                self.cache_hits += 1
+                return base + elapsed // 1000000000
+        self.cache_misses += 1
+        return None
+
+    def _cache_update(self, secs, now):
+        """
+        Re-anchor the cache to secs read from the RTC at monotonic_ns() now.
+        """
+        base = self._cache_base
+        if base is not None:
+            self.cache_resyncs += 1
+            drift = secs - (base + (now - self._cache_synced_ns) // 1000000000)
+            self.cache_drift = drift
+            if abs(drift) > self._cache_drift_limit:
+                self._cache_resync_ns = max(self._cache_resync_ns // 2, _CACHE_MIN_RESYNC_NS)
+            else:
+                self._cache_resync_ns = self._cache_interval_ns
+        self._cache_base = secs
+        self._cache_synced_ns = now
 
     def _to_time_struct(self, Year, Month, Day, Hour, Minute, Second, Wday, Yday = -1, isDst = -1):
         """
@@ -90,173 +625,246 @@ class DS1302RTC:
     #     """
     #     pass 
 
-    def _start_tx(self):
+    def _start_tx(self, tx):
         """
         Start of transaction.
         """
-        self._SCLK_PIN.value = False
-        self._CE_PIN.value = True
+        self._transport.select()
 
-        time.sleep(.004)
+        _delay_ns(self._timing.setup_ns[tx])
 
-    def _end_tx(self):
+    def _end_tx(self, tx):
         """
         End of transaction.
         """
-        self._IO_PIN.switch_to_input()
-        self._SCLK_PIN.value = False
-        self._CE_PIN.value = False
+        self._transport.deselect()
 
-        time.sleep(.004)
+        _delay_ns(self._timing.hold_ns[tx])
 
-    def _write_byte(self, byte):
+    def _read_burst(self, command, tx, buf, skip, count):
         """
-        Write byte to the chip.
+        Burst read: skip bytes are clocked out and dropped, the next count
+        bytes are stored in buf[0:count].
         """
-        # data pin is now output
-        self._IO_PIN.switch_to_output()
-
-        # clock the byte to chip
-        for _ in range(8):
-            self._SCLK_PIN.value = False
-            time.sleep(self.CLK_DELAY)
-
-            # chip read data on clk rising edge
-            self._IO_PIN.value = (byte & 0x01)
-            byte >>= 1
-            self._SCLK_PIN.value = True
-
-            time.sleep(self.CLK_DELAY)
+        # start of message
+        self._start_tx(tx)
+        self._transport.clock_in(command, buf, skip, count)
+        # end of message
+        self._end_tx(tx)
 
-    def _read_byte(self):
+    def read_ram_into(self, buf, start=0, length=None):
         """
-        Read byte from the chip.
+        Read RAM from address start into buf without allocating.  length
+        defaults to as much as fits in buf.  Returns the number of bytes
+        read.
         """
-        # data pin is now input (pull-down resistor embedded in chip)
-        self._IO_PIN.switch_to_input()
-        # clock the byte from chip
-        byte = 0
-        for i in range(8):
-            # make a high pulse on CLK pin
-            self._SCLK_PIN.value = True
-            
-            time.sleep(self.CLK_DELAY)
-            self._SCLK_PIN.value = False
-            
-            time.sleep(self.CLK_DELAY)
-            # chip out data on clk falling edge: store current bit into byte
-            bit = 1 if self._IO_PIN.value == True else 0 
-            # Debug print 
-            # print(self._IO_PIN.value, bit)
-            byte |= ((2 ** i) * bit)
-
+        length = _ram_span(buf, start, length)
+        # a RAM burst always starts at address 0
+        self._read_burst(DS1302_RAM_BURST_READ, TX_RAM_READ, buf, start, length)
+        return length
 
-        return byte  
-           
     def read_ram(self):
         """
         Read RAM as bytes
         """
-        # start of message
-        self._start_tx()
-        # read ram burst
-        self._write_byte(DS1302_RAM_BURST_READ)
-
-        # read data bytes
-        byte_a = bytearray()
-        for _ in range(31):
-            byte_a.append(self._read_byte())
+        byte_a = bytearray(31)
+        self._read_burst(DS1302_RAM_BURST_READ, TX_RAM_READ, byte_a, 0, 31)
+        return byte_a
 
+    def _write_burst(self, command, tx, buf, count):
+        """
+        Burst write of buf[0:count].
+        """
+        # start message
+        self._start_tx(tx)
+        self._transport.clock_out(command, buf, count)
         # end of message
-        self._end_tx()
+        self._end_tx(tx)
 
-        return byte_a
+    def write_ram(self, byte_a, length=None):
+        """
+        Write RAM with bytes, starting at address 0.  length limits how many
+        bytes of byte_a are sent.
+        """
+        count = _ram_span(byte_a, 0, length)
+        self._write_burst(DS1302_RAM_BURST_WRITE, TX_RAM_WRITE, byte_a, count)
 
-    def write_ram(self, byte_a):
+    def write_ram_byte(self, addr, value):
         """
-        Write RAM with bytes
+        Write a single RAM register.
         """
-        # start message
-        self._start_tx()
-        # write ram burst
-        self._write_byte(DS1302_RAM_BURST_WRITE)
+        if not 0 <= addr < 31:
+            raise ValueError("RAM address out of range")
+        buf = self._reg_buf
+        buf[0] = value
+        self._write_burst(DS1302_RAM_WRITE | addr << 1, TX_REGISTER, buf, 1)
 
-        # write data bytes
-        for i in range(min(len(byte_a), 31)):
-            self._write_byte(ord(byte_a[i:i + 1]))
+    def read_clock_into(self, buf):
+        """
+        Read the seven raw BCD clock registers (seconds .. year) into buf
+        without allocating.
+        """
+        if len(buf) < 7:
+            raise ValueError("buffer must hold 7 bytes")
+        self._read_clock(buf)
 
-        # end of message
-        self._end_tx()
+    def _read_clock(self, buf):
+        self._read_burst(DS1302_CLOCK_BURST_READ, TX_CLOCK_READ, buf, 0, 7)
 
     def read_dt_bytes(self):
         """
         Read current date and time from RTC chip.
         """
-        # start message
-        self._start_tx()
-        # read clock burst
-        self._write_byte(DS1302_CLOCK_BURST_READ)
-
-        byte_l = []
-        for _ in range(7):
-            byte_l.append(self._read_byte())
-        
-        # end of message
-        self._end_tx()
-
-        return byte_l
+        buf = self._clock_buf
+        self._read_clock(buf)
+        return list(buf)
 
     def read_datetime(self):
         """
-        Read current date and time from RTC chip.
+        Read current date and time from RTC chip, or from the cached clock
+        if enable_cache() was called.
         """
-        # start message
-        self._start_tx()
-        # read clock burst
-        self._write_byte(DS1302_CLOCK_BURST_READ)
-
-        byte_l = []
-        for _ in range(7):
-            byte_l.append(self._read_byte())
-        
-        # end of message
-        self._end_tx()
-        
-        # decode bytes
-        second = ((byte_l[0] & 0x70) >> 4) * 10 + (byte_l[0] & 0x0f)
-        minute = ((byte_l[1] & 0x70) >> 4) * 10 + (byte_l[1] & 0x0f)
-        hour = ((byte_l[2] & 0x30) >> 4) * 10 + (byte_l[2] & 0x0f)
-        day = ((byte_l[3] & 0x30) >> 4) * 10 + (byte_l[3] & 0x0f)
-        month = ((byte_l[4] & 0x10) >> 4) * 10 + (byte_l[4] & 0x0f)
-        year = ((byte_l[6] & 0xf0) >> 4) * 10 + (byte_l[6] & 0x0f) + 2000
-        wday = (byte_l[5] & 0x70)
+        if self._cache_interval_ns:
+            return self._to_time_struct(*_split_epoch(self._cached_epoch()))
+
+        byte_l = self._clock_buf
+        self._read_clock(byte_l)
 
         # return datetime value
-        return self._to_time_struct(year, month, day, hour, minute, second, wday)
+        return self._to_time_struct(*_split_bcd(byte_l))
 
-    def write_datetime(self, dt):
+    def read_epoch(self):
         """
-        Write a python datetime to RTC chip.
+        Read current time as integer seconds since 1970-01-01, without
+        building a struct_time.  Uses the cached clock if enabled.
         """
-        # format message
-        byte_l = [0] * 9
-        byte_l[0] = (dt.tm_sec // 10) << 4 | dt.tm_sec % 10
-        byte_l[1] = (dt.tm_min // 10) << 4 | dt.tm_min % 10
-        byte_l[2] = (dt.tm_hour // 10) << 4 | dt.tm_hour % 10
-        byte_l[3] = (dt.tm_mday // 10) << 4 | dt.tm_mday % 10
-        byte_l[4] = (dt.tm_mon // 10) << 4 | dt.tm_mon % 10
-        # byte_l[5] = (dt.tm_wday // 10) << 4 | dt.tm_wday % 10
-        byte_l[6] = ((dt.tm_year-2000) // 10) << 4 | (dt.tm_year-2000) % 10
+        if self._cache_interval_ns:
+            return self._cached_epoch()
+        buf = self._clock_buf
+        self._read_clock(buf)
+        return _epoch_from_bcd(buf)
 
-        # start message
-        self._start_tx()
+    def _write_clock(self):
+        """
+        Burst write the clock registers in _clock_wbuf.
+        """
+        self._write_burst(DS1302_CLOCK_BURST_WRITE, TX_CLOCK_WRITE, self._clock_wbuf, 8)
 
-        # write clock burst
-        self._write_byte(DS1302_CLOCK_BURST_WRITE)
+        # the cached clock is anchored to the old time
+        self._cache_base = None
 
-        # write all data
-        for byte in byte_l:
-            self._write_byte(byte)
+    def write_datetime(self, dt):
+        """
+        Write a python datetime (2000..2099) to RTC chip.
+        """
+        _bcd_from_datetime(dt, self._clock_wbuf)
+        self._write_clock()
 
-        # end of message
-        self._end_tx()
+    def write_epoch(self, secs):
+        """
+        Write integer seconds since 1970-01-01 (2000..2099) to RTC chip.
+        """
+        _bcd_from_epoch(secs, self._clock_wbuf)
+        self._write_clock()
+
+
+class DS1302RAM:
+    """
+    Write-back cache of the 31 byte battery backed RAM.
+
+    Index it like a bytearray; reads come from the mirror, writes only mark
+    bytes dirty.  flush() sends the dirty bytes either as single register
+    writes or as one burst from address 0, whichever clocks fewer bytes.
+    Assigning a value a byte already holds is not a change and costs
+    nothing.
+    """
+    def __init__(self, rtc):
+        self._rtc = rtc
+        self._mirror = bytearray(31)
+        self._dirty = bytearray(31)
+        self._dirty_count = 0
+        self._dirty_hi = -1
+
+        self.skipped = 0
+        self.single_writes = 0
+        self.burst_writes = 0
+
+        self.reload()
+
+    def reload(self):
+        """
+        Discard pending changes and re-read the RAM.
+        """
+        self._rtc.read_ram_into(self._mirror)
+        self._clear_dirty()
+
+    def _clear_dirty(self):
+        dirty = self._dirty
+        for i in range(31):
+            dirty[i] = 0
+        self._dirty_count = 0
+        self._dirty_hi = -1
+
+    def __len__(self):
+        return 31
+
+    def __getitem__(self, index):
+        return self._mirror[index]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            for i, v in zip(range(*index.indices(31)), value):
+                self._set(i, v)
+        else:
+            if index < 0:
+                index += 31
+            self._set(index, value)
+
+    def _set(self, index, value):
+        if self._mirror[index] == value:
+            self.skipped += 1
+            return
+        self._mirror[index] = value
+        if not self._dirty[index]:
+            self._dirty[index] = 1
+            self._dirty_count += 1
+            if index > self._dirty_hi:
+                self._dirty_hi = index
+
+    @property
+    def dirty(self):
+        """
+        Number of bytes waiting to be flushed.
+        """
+        return self._dirty_count
+
+    def flush(self):
+        """
+        Write dirty bytes to the chip.  Returns the number of data bytes
+        written, 0 if nothing had changed.
+        """
+        count = self._dirty_count
+        if not count:
+            return 0
+
+        # a burst must start at address 0, so it also rewrites the clean
+        # bytes below the highest dirty one
+        burst_cost = self._dirty_hi + 2 + _TX_COST_BYTES
+        single_cost = count * (2 + _TX_COST_BYTES)
+        rtc = self._rtc
+        if burst_cost <= single_cost:
+            sent = self._dirty_hi + 1
+            rtc.write_ram(self._mirror, sent)
+            self.burst_writes += 1
+        else:
+            sent = 0
+            mirror = self._mirror
+            dirty = self._dirty
+            for i in range(self._dirty_hi + 1):
+                if dirty[i]:
+                    rtc.write_ram_byte(i, mirror[i])
+                    sent += 1
+            self.single_writes += sent
+
+        self._clear_dirty()
+        return sent
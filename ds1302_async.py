@@ -0,0 +1,196 @@
+# DS1302 Real Time Clock, asyncio driver
+# Author: David Boyd
+# License: MIT License (https://opensource.org/licenses/MIT)
+"""
+asyncio flavour of the DS1302 driver.
+
+AsyncDS1302RTC has the same public methods as DS1302RTC, but as coroutines.
+The CE setup/hold delays around each transaction are awaited when they are
+long enough to matter, so display refresh, sensor tasks and so on keep
+running while the clock is read.  The per-bit clocking is still done
+synchronously, it is far too short to be worth yielding for.  A lock keeps
+tasks sharing one driver from interleaving transactions.
+
+With a transport that locks a shared bus (SPITransport) the driver yields
+while another device has the bus, and spins rather than awaits the setup
+delay, so the bus is never held across an await.
+
+    rtc = AsyncDS1302RTC(board.D5, board.D6, board.D7)
+    now = await rtc.read_datetime()
+
+The constructor itself is synchronous, it only sends two register writes.
+DS1302RAM needs the blocking DS1302RTC.  instrument() works as for
+DS1302RTC; latencies include any wait for the lock.
+"""
+import asyncio
+import time
+from micropython import const
+
+from ds1302 import (
+    DS1302RTC, TIMING_CONSERVATIVE,
+    DS1302_CLOCK_BURST_READ, DS1302_CLOCK_BURST_WRITE,
+    DS1302_RAM_BURST_READ, DS1302_RAM_BURST_WRITE, DS1302_RAM_WRITE,
+    TX_REGISTER, TX_CLOCK_READ, TX_CLOCK_WRITE, TX_RAM_READ, TX_RAM_WRITE,
+    _delay_ns, _epoch_from_bcd, _split_bcd, _split_epoch,
+    _bcd_from_datetime, _bcd_from_epoch, _ram_span,
+)
+
+# Settle delays at least this long are awaited, shorter ones spin.
+_AWAIT_LIMIT_NS = const(50000)
+
+
+async def _settle(ns):
+    if ns >= _AWAIT_LIMIT_NS:
+        await asyncio.sleep(ns / 1000000000)
+    else:
+        _delay_ns(ns)
+
+
+class AsyncDS1302RTC(DS1302RTC):
+
+    def __init__(self, ce_pin=None, data_pin=None, sclk_pin=None,
+                 timing=TIMING_CONSERVATIVE, transport=None):
+        """
+        asyncio driver for a DS 1302 RTC
+        """
+        super().__init__(ce_pin, data_pin, sclk_pin, timing, transport)
+        self._lock = asyncio.Lock()
+
+    async def _start_tx_async(self, tx):
+        transport = self._transport
+        if transport.BUS_LOCK:
+            while not transport.try_select():
+                await asyncio.sleep(0)
+            _delay_ns(self._timing.setup_ns[tx])
+        else:
+            transport.select()
+            await _settle(self._timing.setup_ns[tx])
+
+    async def _end_tx_async(self, tx):
+        self._transport.deselect()
+        await _settle(self._timing.hold_ns[tx])
+
+    async def _read_burst_async(self, command, tx, buf, skip, count):
+        # caller holds the lock
+        await self._start_tx_async(tx)
+        self._transport.clock_in(command, buf, skip, count)
+        await self._end_tx_async(tx)
+
+    async def _write_burst_async(self, command, tx, buf, count):
+        # caller holds the lock
+        await self._start_tx_async(tx)
+        self._transport.clock_out(command, buf, count)
+        await self._end_tx_async(tx)
+
+    # The scratch buffers are only filled with the lock held, and read back
+    # before the next await, so tasks can share them.
+
+    async def read_ram_into(self, buf, start=0, length=None):
+        """
+        Read RAM from address start into buf without allocating.  Returns
+        the number of bytes read.
+        """
+        length = _ram_span(buf, start, length)
+        async with self._lock:
+            await self._read_burst_async(DS1302_RAM_BURST_READ, TX_RAM_READ, buf, start, length)
+        return length
+
+    async def read_ram(self):
+        """
+        Read RAM as bytes
+        """
+        byte_a = bytearray(31)
+        async with self._lock:
+            await self._read_burst_async(DS1302_RAM_BURST_READ, TX_RAM_READ, byte_a, 0, 31)
+        return byte_a
+
+    async def write_ram(self, byte_a, length=None):
+        """
+        Write RAM with bytes, starting at address 0.
+        """
+        count = _ram_span(byte_a, 0, length)
+        async with self._lock:
+            await self._write_burst_async(DS1302_RAM_BURST_WRITE, TX_RAM_WRITE, byte_a, count)
+
+    async def write_ram_byte(self, addr, value):
+        """
+        Write a single RAM register.
+        """
+        if not 0 <= addr < 31:
+            raise ValueError("RAM address out of range")
+        async with self._lock:
+            buf = self._reg_buf
+            buf[0] = value
+            await self._write_burst_async(DS1302_RAM_WRITE | addr << 1, TX_REGISTER, buf, 1)
+
+    async def read_clock_into(self, buf):
+        """
+        Read the seven raw BCD clock registers into buf.
+        """
+        if len(buf) < 7:
+            raise ValueError("buffer must hold 7 bytes")
+        await self._read_clock_async(buf)
+
+    async def _read_clock_async(self, buf):
+        async with self._lock:
+            await self._read_burst_async(DS1302_CLOCK_BURST_READ, TX_CLOCK_READ, buf, 0, 7)
+
+    async def read_dt_bytes(self):
+        """
+        Read current date and time from RTC chip.
+        """
+        buf = self._clock_buf
+        await self._read_clock_async(buf)
+        return list(buf)
+
+    async def _cached_epoch_async(self):
+        secs = self._cache_lookup(time.monotonic_ns())
+        if secs is None:
+            buf = self._clock_buf
+            async with self._lock:
+                await self._read_burst_async(DS1302_CLOCK_BURST_READ, TX_CLOCK_READ, buf, 0, 7)
+                # anchor to when the burst completed, not to before the
+                # wait for the lock
+                now = time.monotonic_ns()
+                secs = _epoch_from_bcd(buf)
+                self._cache_update(secs, now)
+        return secs
+
+    async def read_datetime(self):
+        """
+        Read current date and time from RTC chip, or from the cached clock
+        if enable_cache() was called.
+        """
+        if self._cache_interval_ns:
+            return self._to_time_struct(*_split_epoch(await self._cached_epoch_async()))
+        buf = self._clock_buf
+        await self._read_clock_async(buf)
+        return self._to_time_struct(*_split_bcd(buf))
+
+    async def read_epoch(self):
+        """
+        Read current time as integer seconds since 1970-01-01.
+        """
+        if self._cache_interval_ns:
+            return await self._cached_epoch_async()
+        buf = self._clock_buf
+        await self._read_clock_async(buf)
+        return _epoch_from_bcd(buf)
+
+    async def write_datetime(self, dt):
+        """
+        Write a python datetime (2000..2099) to RTC chip.
+        """
+        async with self._lock:
+            _bcd_from_datetime(dt, self._clock_wbuf)
+            await self._write_burst_async(DS1302_CLOCK_BURST_WRITE, TX_CLOCK_WRITE, self._clock_wbuf, 8)
+        self._cache_base = None
+
+    async def write_epoch(self, secs):
+        """
+        Write integer seconds since 1970-01-01 (2000..2099) to RTC chip.
+        """
+        async with self._lock:
+            _bcd_from_epoch(secs, self._clock_wbuf)
+            await self._write_burst_async(DS1302_CLOCK_BURST_WRITE, TX_CLOCK_WRITE, self._clock_wbuf, 8)
+        self._cache_base = None
@@ -0,0 +1,344 @@
+# DS1302 benchmarks
+# Author: David Boyd
+# License: MIT License (https://opensource.org/licenses/MIT)
+"""
+Check and measure DS1302RTC against the chip emulator in ds1302_sim.
+
+    python ds1302_bench.py
+
+For each public operation this reports the wall time, the pin operations
+(value writes, value reads and direction switches) and the time spent in
+the driver's bus delays, all per call.
+"""
+import asyncio
+import time
+
+import ds1302_sim
+ds1302_sim.install()
+ds1302_sim.install_gpiod()
+
+import ds1302
+import ds1302_async
+import ds1302_gpiod
+import ds1302_stats
+
+CE, IO, SCLK = "CE", "IO", "SCLK"
+
+# The original fixed delays (5 ms per half bit, 4 ms around each transaction),
+# kept as a user-defined profile for comparison.
+TIMING_LEGACY = ds1302.DS1302Timing("legacy", 5000000, 4000000, 4000000)
+
+_TEST_TIME = time.struct_time((2024, 2, 29, 23, 59, 58, 3, 60, -1))
+_TEST_EPOCH = 1709251198
+_TEST_RAM = bytes(range(1, 32))
+
+_delay_ns = ds1302._delay_ns
+_delay_total = 0
+
+
+def _counting_delay_ns(ns):
+    global _delay_total
+    start = time.monotonic_ns()
+    _delay_ns(ns)
+    _delay_total += time.monotonic_ns() - start
+
+
+TRANSPORTS = ("bitbang", "spi", "gpiod")
+
+
+def make_rtc(timing=ds1302.TIMING_DATASHEET_MIN, transport="bitbang"):
+    """
+    Return (rtc, chip) wired together on fresh simulated pins, using one of
+    TRANSPORTS.
+    """
+    chip = ds1302_sim.DS1302Chip(CE, IO, SCLK)
+    if transport == "spi":
+        spi = ds1302_sim.SPI(SCLK, IO)
+        transport = ds1302.SPITransport(spi, ds1302_sim.DigitalInOut(CE))
+    elif transport == "gpiod":
+        transport = ds1302_gpiod.GpiodTransport("/dev/gpiochip0", CE, IO, SCLK)
+    else:
+        transport = None
+    rtc = ds1302.DS1302RTC(CE, IO, SCLK, timing=timing, transport=transport)
+    return rtc, chip
+
+
+def verify(transport="bitbang"):
+    """
+    Round-trip the clock and RAM through the emulator, raising
+    AssertionError on any mismatch.
+    """
+    rtc, chip = make_rtc(transport=transport)
+    assert not chip.write_protect, "write protect left on"
+    assert chip.trickle == 0, "trickle charger left on"
+
+    rtc.write_datetime(_TEST_TIME)
+    got = rtc.read_datetime()
+    assert tuple(got)[:8] == tuple(_TEST_TIME)[:8], got
+    chip.advance(3)
+    got = rtc.read_datetime()
+    assert tuple(got)[:8] == (2024, 3, 1, 0, 0, 1, 4, 61), got
+    assert rtc.read_epoch() == _TEST_EPOCH + 3
+
+    rtc.write_epoch(_TEST_EPOCH)
+    assert tuple(rtc.read_datetime())[:8] == tuple(_TEST_TIME)[:8]
+
+    rtc.write_ram(_TEST_RAM)
+    assert bytes(rtc.read_ram()) == _TEST_RAM
+    assert bytes(chip.ram) == _TEST_RAM
+
+
+def verify_async():
+    """
+    Round-trip AsyncDS1302RTC through the emulator on an SPI bus shared
+    with another task that holds the bus across awaits, raising
+    AssertionError on any mismatch.  Hangs if either side spins on the
+    bus lock while the other holds it.
+    """
+    ds1302_sim.DS1302Chip(CE, IO, SCLK, clock=lambda: 0.0)
+    spi = ds1302_sim.SPI(SCLK, IO)
+    transport = ds1302.SPITransport(spi, ds1302_sim.DigitalInOut(CE))
+    rtc = ds1302_async.AsyncDS1302RTC(transport=transport)
+
+    async def other_device(rounds):
+        for _ in range(rounds):
+            while not spi.try_lock():
+                await asyncio.sleep(0)
+            await asyncio.sleep(0.001)
+            spi.unlock()
+            await asyncio.sleep(0)
+
+    async def main():
+        other = asyncio.create_task(other_device(20))
+        await asyncio.sleep(0)
+        await rtc.write_epoch(_TEST_EPOCH)
+        for _ in range(10):
+            assert await rtc.read_epoch() == _TEST_EPOCH
+            await rtc.write_ram(_TEST_RAM)
+            assert bytes(await rtc.read_ram()) == _TEST_RAM
+        await other
+
+    asyncio.run(main())
+
+
+def verify_async_stats():
+    """
+    Instrument AsyncDS1302RTC with the cache on and run bus transactions
+    and cached reads concurrently, raising AssertionError unless every
+    method is credited with the same bytes and pin writes as when the
+    calls run one after the other.
+    """
+    ds1302_sim.DS1302Chip(CE, IO, SCLK, clock=lambda: 0.0)
+    rtc = ds1302_async.AsyncDS1302RTC(CE, IO, SCLK)
+    rtc.enable_cache()
+
+    async def cached_reads(count):
+        for _ in range(count):
+            await asyncio.sleep(0)
+            await rtc.read_epoch()
+
+    async def main():
+        # the first read fills the cache
+        await rtc.read_epoch()
+        stats = rtc.instrument()
+        await rtc.read_ram()
+        await rtc.write_ram_byte(2, 5)
+        await cached_reads(30)
+        alone = (list(stats.calls), list(stats.bytes), list(stats.pin_writes))
+        stats.reset()
+        await asyncio.gather(rtc.read_ram(), cached_reads(30), rtc.write_ram_byte(2, 5))
+        together = (list(stats.calls), list(stats.bytes), list(stats.pin_writes))
+        rtc.instrument(False)
+        assert together == alone, (alone, together)
+        assert stats.bytes[ds1302_stats.METHODS.index("read_epoch")] == 0
+
+    asyncio.run(main())
+
+
+def _operations(rtc):
+    return (
+        ("read_datetime", rtc.read_datetime),
+        ("write_datetime", lambda: rtc.write_datetime(_TEST_TIME)),
+        ("read_epoch", rtc.read_epoch),
+        ("write_epoch", lambda: rtc.write_epoch(_TEST_EPOCH)),
+        ("read_ram", rtc.read_ram),
+        ("write_ram", lambda: rtc.write_ram(_TEST_RAM)),
+    )
+
+
+def measure(func, iterations):
+    """
+    Run func and return per-call (wall ns, pin writes, pin reads,
+    pin switches, delay ns).
+    """
+    global _delay_total
+    stats = ds1302_sim.stats
+    ds1302._delay_ns = _counting_delay_ns
+    try:
+        stats.reset()
+        _delay_total = 0
+        start = time.monotonic_ns()
+        for _ in range(iterations):
+            func()
+        wall = time.monotonic_ns() - start
+    finally:
+        ds1302._delay_ns = _delay_ns
+    return (wall // iterations, stats.writes / iterations,
+            stats.reads / iterations, stats.switches / iterations,
+            _delay_total // iterations)
+
+
+def run(timing=ds1302.TIMING_DATASHEET_MIN, iterations=200, transport="bitbang"):
+    """
+    Return [(operation, measure() result)] for every public operation.
+    """
+    rtc, _ = make_rtc(timing, transport)
+    return [(name, measure(func, iterations)) for name, func in _operations(rtc)]
+
+
+def profile_rates(duration=1.0, profiles=None):
+    """
+    Return [(profile name, read_datetime transactions per second)].
+    """
+    if profiles is None:
+        profiles = list(ds1302.TIMING_PROFILES.values())
+    results = []
+    for profile in profiles:
+        rtc, _ = make_rtc(profile)
+        count = 0
+        start = time.monotonic_ns()
+        end = start + int(duration * 1000000000)
+        now = start
+        while now < end:
+            rtc.read_datetime()
+            count += 1
+            now = time.monotonic_ns()
+        results.append((profile.name, count * 1000000000 / (now - start)))
+    return results
+
+
+def cache_rate(duration=3.0, resync_s=1.0, rate=1.0):
+    """
+    Hammer read_datetime() with the cached clock enabled.  rate sets how
+    fast the emulated RTC runs against the host clock, to exercise drift.
+
+    Return (calls per second, hits, misses, resyncs, last drift).
+    """
+    rtc, chip = make_rtc()
+    chip.set_time(0)
+    chip.rate = rate
+    rtc.enable_cache(resync_s=resync_s)
+    count = 0
+    start = time.monotonic_ns()
+    end = start + int(duration * 1000000000)
+    now = start
+    while now < end:
+        rtc.read_datetime()
+        count += 1
+        now = time.monotonic_ns()
+    return (count * 1000000000 / (now - start), rtc.cache_hits,
+            rtc.cache_misses, rtc.cache_resyncs, rtc.cache_drift)
+
+
+def ram_cache_writes(iterations=200):
+    """
+    Compare rewriting the whole RAM with flushing a DS1302RAM cache after
+    changing one byte, a scattered few bytes and most of the RAM.
+
+    Return [(case, full write_ram() result, cache flush result)], each a
+    measure() tuple.
+    """
+    rtc, chip = make_rtc()
+    ram = ds1302.DS1302RAM(rtc)
+    image = bytearray(31)
+    cases = (
+        ("1 byte", (5,)),
+        ("3 scattered", (2, 17, 29)),
+        ("24 bytes", tuple(range(24))),
+    )
+    results = []
+    for label, indexes in cases:
+        def full():
+            for i in indexes:
+                image[i] = (image[i] + 1) & 0xFF
+            rtc.write_ram(image)
+
+        def cached():
+            for i in indexes:
+                ram[i] = (ram[i] + 1) & 0xFF
+            ram.flush()
+
+        results.append((label, measure(full, iterations), measure(cached, iterations)))
+    assert bytes(chip.ram) == bytes(ram[:])
+    return results
+
+
+def instrument_overhead(iterations=500):
+    """
+    read_datetime wall ns per call: never instrumented, instrumented, and
+    after instrumentation was switched off again.
+    """
+    rtc, _ = make_rtc()
+    results = [measure(rtc.read_datetime, iterations)[0]]
+    rtc.instrument()
+    results.append(measure(rtc.read_datetime, iterations)[0])
+    rtc.instrument(False)
+    results.append(measure(rtc.read_datetime, iterations)[0])
+    return results
+
+
+def report(results):
+    print("  {:<16}{:>12}{:>9}{:>9}{:>9}{:>12}".format(
+        "operation", "wall us", "writes", "reads", "switch", "delay us"))
+    for name, (wall, writes, reads, switches, delay) in results:
+        print("  {:<16}{:>12.1f}{:>9.0f}{:>9.0f}{:>9.0f}{:>12.1f}".format(
+            name, wall / 1000, writes, reads, switches, delay / 1000))
+
+
+def main():
+    for transport in TRANSPORTS:
+        verify(transport)
+    verify_async()
+    verify_async_stats()
+    print("emulator round trip ok: {}, async on shared spi".format(", ".join(TRANSPORTS)))
+    print("async instrumentation ok with overlapping calls")
+    for profile in ds1302.TIMING_PROFILES.values():
+        print()
+        print("profile: {}".format(profile.name))
+        report(run(profile))
+
+    # the loopback SPI clocks the emulator in Python, so its wall time says
+    # little about real hardware; the pin counts show what is left for the
+    # driver to do (just CE)
+    for transport in TRANSPORTS[1:]:
+        print()
+        print("transport: {} (datasheet-minimum)".format(transport))
+        report(run(transport=transport))
+
+    print()
+    print("read_datetime transactions per second")
+    profiles = list(ds1302.TIMING_PROFILES.values()) + [TIMING_LEGACY]
+    for name, rate in profile_rates(profiles=profiles):
+        print("  {:<20} {:10.1f}".format(name, rate))
+
+    print()
+    print("RAM updates: full write_ram vs DS1302RAM.flush (pin writes, wall us)")
+    for label, full, cached in ram_cache_writes():
+        print("  {:<12} full {:5.0f} {:8.1f}   cached {:5.0f} {:8.1f}".format(
+            label, full[1], full[0] / 1000, cached[1], cached[0] / 1000))
+
+    print()
+    off, on, detached = instrument_overhead()
+    print("instrumentation, read_datetime wall us: off {:.1f}  on {:.1f}  detached {:.1f}".format(
+        off / 1000, on / 1000, detached / 1000))
+
+    print()
+    print("cached read_datetime (datasheet-minimum, resync every 1 s)")
+    for label, rate in (("in step", 1.0), ("RTC 2x fast", 2.0)):
+        calls, hits, misses, resyncs, drift = cache_rate(rate=rate)
+        print("  {:<12} {:10.1f}/s  hits {} misses {} resyncs {} drift {}s".format(
+            label, calls, hits, misses, resyncs, drift))
+
+
+if __name__ == "__main__":
+    main()
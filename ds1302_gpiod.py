@@ -0,0 +1,89 @@
+# DS1302 Real Time Clock, Linux GPIO character device transport
+# Author: David Boyd
+# License: MIT License (https://opensource.org/licenses/MIT)
+"""
+Runs DS1302RTC on a Linux single board computer through the GPIO character
+device (``/dev/gpiochipN``) using the libgpiod v2 Python bindings
+(``pip install gpiod``).
+
+    from ds1302 import DS1302RTC, TIMING_DATASHEET_MIN
+    from ds1302_gpiod import GpiodTransport
+
+    transport = GpiodTransport("/dev/gpiochip0", ce=17, io=27, sclk=22)
+    rtc = DS1302RTC(transport=transport, timing=TIMING_DATASHEET_MIN)
+
+ds1302 itself needs ``digitalio`` and ``micropython``, which Adafruit
+Blinka provides on Linux.  Lines are given as offsets on the chip.  The
+bus is bit-banged exactly as on a microcontroller, each line wrapped to
+look like a DigitalInOut.
+"""
+import gpiod
+from gpiod.line import Direction, Value
+
+import digitalio
+from ds1302 import BitBangTransport
+
+
+class GpiodPin:
+    """
+    The part of the DigitalInOut interface BitBangTransport uses, on one
+    line of a shared gpiod line request.
+    """
+    def __init__(self, request, offset):
+        self._request = request
+        self._offset = offset
+        self._direction = digitalio.Direction.INPUT
+
+    @property
+    def direction(self):
+        return self._direction
+
+    @direction.setter
+    def direction(self, direction):
+        if direction == digitalio.Direction.OUTPUT:
+            self.switch_to_output()
+        else:
+            self.switch_to_input()
+
+    def switch_to_output(self, value=False, drive_mode=None):
+        value = Value.ACTIVE if value else Value.INACTIVE
+        self._request.reconfigure_lines(config={self._offset: gpiod.LineSettings(
+            direction=Direction.OUTPUT, output_value=value)})
+        self._direction = digitalio.Direction.OUTPUT
+
+    def switch_to_input(self, pull=None):
+        self._request.reconfigure_lines(config={self._offset: gpiod.LineSettings(
+            direction=Direction.INPUT)})
+        self._direction = digitalio.Direction.INPUT
+
+    @property
+    def value(self):
+        return self._request.get_value(self._offset) == Value.ACTIVE
+
+    @value.setter
+    def value(self, value):
+        self._request.set_value(self._offset, Value.ACTIVE if value else Value.INACTIVE)
+
+    def deinit(self):
+        pass
+
+
+class GpiodTransport(BitBangTransport):
+    """
+    BitBangTransport on three lines of a Linux GPIO chip.
+    """
+    def __init__(self, chip_path, ce, io, sclk, consumer="ds1302"):
+        self._request = gpiod.request_lines(chip_path, consumer=consumer, config={
+            (ce, sclk): gpiod.LineSettings(direction=Direction.OUTPUT,
+                                           output_value=Value.INACTIVE),
+            io: gpiod.LineSettings(direction=Direction.INPUT),
+        })
+        super().__init__(GpiodPin(self._request, ce),
+                         GpiodPin(self._request, io),
+                         GpiodPin(self._request, sclk))
+
+    def deinit(self):
+        """
+        Release the GPIO lines.
+        """
+        self._request.release()
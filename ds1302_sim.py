@@ -0,0 +1,519 @@
+# DS1302 chip emulator
+# Author: David Boyd
+# License: MIT License (https://opensource.org/licenses/MIT)
+"""
+Stand-in for the CircuitPython ``digitalio`` module with a pin-level DS1302
+model behind it, so ds1302.py can be run, checked and timed on a desktop
+Python with no hardware attached.
+
+    import ds1302_sim
+    ds1302_sim.install()
+    chip = ds1302_sim.DS1302Chip("CE", "IO", "SCLK")
+
+    import ds1302
+    rtc = ds1302.DS1302RTC("CE", "IO", "SCLK")
+
+The chip must be created before the driver opens its pins.  SPI is a
+loopback busio.SPI for ds1302.SPITransport and install_gpiod() adds a fake
+``gpiod`` for ds1302_gpiod.GpiodTransport, both wired to the same model.  Any pin that is
+not attached to a chip behaves as a plain latch.
+
+The model covers CE framing, LSB-first shifting (data in on SCLK rising
+edges, data out on falling edges), single register and burst access to the
+clock and RAM, the write protect bit and the trickle charge register.  The
+clock only runs in 24 hour mode.
+"""
+import sys
+import time
+
+
+class Direction:
+    INPUT = 0
+    OUTPUT = 1
+
+
+class Pull:
+    UP = 1
+    DOWN = 2
+
+
+class PinStats:
+    """
+    Pin operation counters shared by every simulated pin.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.writes = 0
+        self.reads = 0
+        self.switches = 0
+
+    @property
+    def total(self):
+        return self.writes + self.reads + self.switches
+
+
+stats = PinStats()
+
+# pin -> (chip, role) for pins wired to an emulated chip
+_attached = {}
+
+_CE = 0
+_IO = 1
+_SCLK = 2
+
+
+class DigitalInOut:
+    """
+    Simulated pin.  Writes are forwarded to the attached chip, reads of the
+    IO line return whatever the chip is driving.
+    """
+    def __init__(self, pin):
+        self.pin = pin
+        self._value = False
+        self._direction = Direction.INPUT
+        self._chip, self._role = _attached.get(pin, (None, None))
+
+    @property
+    def direction(self):
+        return self._direction
+
+    @direction.setter
+    def direction(self, direction):
+        stats.switches += 1
+        self._direction = direction
+
+    def switch_to_output(self, value=False, drive_mode=None):
+        stats.switches += 1
+        self._direction = Direction.OUTPUT
+        self.value = value
+
+    def switch_to_input(self, pull=None):
+        stats.switches += 1
+        self._direction = Direction.INPUT
+
+    @property
+    def value(self):
+        stats.reads += 1
+        if self._direction == Direction.INPUT and self._chip is not None:
+            return self._chip._drive(self._role)
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        stats.writes += 1
+        value = bool(value)
+        self._value = value
+        if self._chip is not None:
+            self._chip._pin_changed(self._role, value)
+
+    def deinit(self):
+        pass
+
+
+class SPI:
+    """
+    Loopback stand-in for busio.SPI wired to a DS1302Chip, for
+    ds1302.SPITransport: each transfer clocks the chip's SCLK and IO bit by
+    bit in SPI mode 0, MSB first.  CE is a separate simulated pin.  The bus
+    talks to the chip directly, so pin stats only count what the driver
+    does itself; transfers and bytes count the SPI calls.
+    """
+    def __init__(self, sclk_pin, io_pin):
+        self._chip = _attached[sclk_pin][0]
+        self._locked = False
+        self.transfers = 0
+        self.bytes = 0
+
+    def try_lock(self):
+        if self._locked:
+            return False
+        self._locked = True
+        return True
+
+    def unlock(self):
+        self._locked = False
+
+    def configure(self, baudrate=100000, polarity=0, phase=0, bits=8):
+        pass
+
+    def write(self, buf, start=0, end=None):
+        if end is None:
+            end = len(buf)
+        self.transfers += 1
+        self.bytes += end - start
+        pin_changed = self._chip._pin_changed
+        for i in range(start, end):
+            byte = buf[i]
+            for bit in range(7, -1, -1):
+                pin_changed(_IO, bool(byte >> bit & 1))
+                pin_changed(_SCLK, True)
+                pin_changed(_SCLK, False)
+
+    def readinto(self, buf, start=0, end=None, write_value=0):
+        if end is None:
+            end = len(buf)
+        self.transfers += 1
+        self.bytes += end - start
+        chip = self._chip
+        pin_changed = chip._pin_changed
+        for i in range(start, end):
+            byte = 0
+            for _ in range(8):
+                pin_changed(_SCLK, True)
+                # MOSI is behind a resistor, the chip wins while it drives IO
+                byte = byte << 1 | chip._drive(_IO)
+                pin_changed(_SCLK, False)
+            buf[i] = byte
+
+
+# seconds since 2000-01-01 <-> calendar, proleptic Gregorian
+_DAYS_BEFORE_MONTH = (0, 0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334)
+
+
+def _is_leap(year):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+def _leaps_before(year):
+    year -= 1
+    return year // 4 - year // 100 + year // 400
+
+
+def _days_since_2000(year, month, day):
+    days = (year - 2000) * 365 + _leaps_before(year) - _leaps_before(2000)
+    days += _DAYS_BEFORE_MONTH[month] + (month > 2 and _is_leap(year)) + day - 1
+    return days
+
+
+# The day register is user defined, the default here is 1 = Monday ..
+# 7 = Sunday (time.struct_time tm_wday + 1).  2000-01-01 was a Saturday.
+_WDAY_OFFSET_2000 = 5
+
+
+def _to_bcd(value):
+    return (value // 10) << 4 | value % 10
+
+
+def _from_bcd(value):
+    return (value >> 4) * 10 + (value & 0x0F)
+
+
+class DS1302Chip:
+    """
+    Pin-level DS1302 model.
+
+    clock is a callable returning seconds (time.monotonic by default), so
+    the RTC can run on a virtual clock.  rate scales how fast the RTC runs
+    relative to that clock, e.g. 1.0001 for a crystal that gains 100 ppm.
+    """
+    def __init__(self, ce_pin, io_pin, sclk_pin, clock=time.monotonic, rate=1.0):
+        _attached[ce_pin] = (self, _CE)
+        _attached[io_pin] = (self, _IO)
+        _attached[sclk_pin] = (self, _SCLK)
+
+        self._clock = clock
+        self.rate = rate
+
+        self.ram = bytearray(31)
+        # power-on state: write protected, clock halted
+        self.write_protect = True
+        self.halted = True
+        self.trickle = 0x5C
+        self._seconds = 0
+        self._wday_offset = 0
+        self._ref = clock()
+
+        self.transactions = 0
+        self.rejected_writes = 0
+
+        self._ce = False
+        self._sclk = False
+        self._io_in = False
+        self._io_out = False
+        self._reset_tx()
+
+    def _reset_tx(self):
+        self._bit = 0
+        self._shift = 0
+        self._command = None
+        self._ignore = False
+        self._reading = False
+        self._ram_access = False
+        self._burst = False
+        self._addr = 0
+        self._index = 0
+        self._out = 0
+        self._burst_buf = None
+
+    # time keeping
+
+    def now(self):
+        """
+        Current RTC time in seconds since 2000-01-01.
+        """
+        if self.halted:
+            return self._seconds
+        elapsed = (self._clock() - self._ref) * self.rate
+        return self._seconds + int(elapsed)
+
+    def set_time(self, seconds, wday=None):
+        """
+        Set the RTC directly, bypassing the pins.
+        """
+        self._seconds = int(seconds)
+        if wday is not None:
+            self._wday_offset = (wday - 1 - self._seconds // 86400) % 7
+        else:
+            self._wday_offset = _WDAY_OFFSET_2000
+        self._ref = self._clock()
+        self.halted = False
+
+    def advance(self, seconds):
+        """
+        Move the RTC forward, for use with a frozen clock.
+        """
+        self._seconds = self.now() + int(seconds)
+        self._ref = self._clock()
+
+    def clock_registers(self):
+        """
+        Return the eight clock registers (seconds .. control) as BCD bytes.
+        """
+        secs = self.now()
+        days, rem = divmod(secs, 86400)
+        year = 2000 + days // 366
+        while _days_since_2000(year + 1, 1, 1) <= days:
+            year += 1
+        yday = days - _days_since_2000(year, 1, 1)
+        month = 1
+        while month < 12 and _DAYS_BEFORE_MONTH[month + 1] + (month + 1 > 2 and _is_leap(year)) <= yday:
+            month += 1
+        mday = yday - _DAYS_BEFORE_MONTH[month] - (month > 2 and _is_leap(year)) + 1
+        wday = (days + self._wday_offset) % 7 + 1
+        return bytearray((
+            _to_bcd(rem % 60) | (0x80 if self.halted else 0),
+            _to_bcd(rem // 60 % 60),
+            _to_bcd(rem // 3600),
+            _to_bcd(mday),
+            _to_bcd(month),
+            wday,
+            _to_bcd(year - 2000),
+            0x80 if self.write_protect else 0,
+        ))
+
+    def _load_clock(self, regs):
+        secs = _from_bcd(regs[0] & 0x7F)
+        minute = _from_bcd(regs[1] & 0x7F)
+        hour = _from_bcd(regs[2] & 0x3F)
+        mday = _from_bcd(regs[3] & 0x3F) or 1
+        month = min(max(_from_bcd(regs[4] & 0x1F), 1), 12)
+        year = 2000 + _from_bcd(regs[6])
+        self._seconds = (_days_since_2000(year, month, mday) * 86400
+                         + hour * 3600 + minute * 60 + secs)
+        self._wday_offset = ((regs[5] & 0x07) - 1 - self._seconds // 86400) % 7
+        self._ref = self._clock()
+        self.halted = bool(regs[0] & 0x80)
+
+    # register access
+
+    def _read_register(self, ram, addr):
+        if ram:
+            return self.ram[addr % 31]
+        if addr < 8:
+            return self._latched[addr]
+        if addr == 8:
+            return self.trickle
+        return 0
+
+    def _write_register(self, ram, addr, value):
+        if not ram and addr == 7:
+            self.write_protect = bool(value & 0x80)
+            return
+        if self.write_protect:
+            self.rejected_writes += 1
+            return
+        if ram:
+            self.ram[addr % 31] = value
+        elif addr < 7:
+            regs = self.clock_registers()
+            regs[addr] = value
+            self._load_clock(regs)
+        elif addr == 8:
+            self.trickle = value
+
+    # pin protocol
+
+    def _drive(self, role):
+        if role == _IO:
+            return self._io_out
+        return False
+
+    def _pin_changed(self, role, value):
+        if role == _CE:
+            if value and not self._ce:
+                self._reset_tx()
+            elif not value and self._ce:
+                self._finish_tx()
+            self._ce = value
+        elif role == _IO:
+            self._io_in = value
+        elif role == _SCLK:
+            if self._ce and value != self._sclk:
+                if value:
+                    self._rising()
+                else:
+                    self._falling()
+            self._sclk = value
+
+    def _rising(self):
+        if self._ignore or self._reading:
+            return
+        self._shift |= self._io_in << self._bit
+        self._bit += 1
+        if self._bit < 8:
+            return
+        byte = self._shift
+        self._bit = 0
+        self._shift = 0
+        if self._command is None:
+            self._start_command(byte)
+        else:
+            self._data_in(byte)
+
+    def _falling(self):
+        if not self._reading:
+            return
+        if self._bit == 0:
+            if self._burst:
+                self._out = self._read_register(self._ram_access, self._index)
+            elif self._index == 0:
+                self._out = self._read_register(self._ram_access, self._addr)
+            else:
+                self._out = 0
+            self._index += 1
+        self._io_out = bool(self._out >> self._bit & 1)
+        self._bit = (self._bit + 1) % 8
+
+    def _start_command(self, byte):
+        self._command = byte
+        self.transactions += 1
+        if not byte & 0x80:
+            # bit 7 clear: the chip ignores the rest of this CE cycle
+            self._ignore = True
+            return
+        self._ram_access = bool(byte & 0x40)
+        self._addr = (byte >> 1) & 0x1F
+        self._burst = self._addr == 31
+        if byte & 0x01:
+            self._reading = True
+            self._latched = self.clock_registers()
+        elif self._burst and not self._ram_access:
+            self._burst_buf = bytearray()
+
+    def _data_in(self, byte):
+        if self._burst_buf is not None:
+            self._burst_buf.append(byte)
+        elif self._burst:
+            self._write_register(self._ram_access, self._index, byte)
+        elif self._index == 0:
+            self._write_register(self._ram_access, self._addr, byte)
+        self._index += 1
+
+    def _finish_tx(self):
+        buf = self._burst_buf
+        # a clock burst write only takes effect once all eight registers
+        # have been sent
+        if buf is not None and len(buf) >= 8:
+            if self.write_protect:
+                self.rejected_writes += 1
+            else:
+                self._load_clock(buf)
+                self.write_protect = bool(buf[7] & 0x80)
+        self._io_out = False
+        self._reset_tx()
+
+
+def _const(value):
+    return value
+
+
+class _LineSettings:
+    def __init__(self, direction=None, output_value=None, **kwargs):
+        self.direction = direction
+        self.output_value = output_value
+
+
+class _LineRequest:
+    """
+    Fake gpiod line request; each line offset is a simulated pin.
+    """
+    def __init__(self, config):
+        self._pins = {}
+        self.reconfigure_lines(config)
+
+    def reconfigure_lines(self, config):
+        gpiod_line = sys.modules["gpiod.line"]
+        for offsets, settings in config.items():
+            if not isinstance(offsets, tuple):
+                offsets = (offsets,)
+            for offset in offsets:
+                pin = self._pins.get(offset)
+                if pin is None:
+                    pin = self._pins[offset] = DigitalInOut(offset)
+                if settings.direction == gpiod_line.Direction.OUTPUT:
+                    pin.switch_to_output(settings.output_value == gpiod_line.Value.ACTIVE)
+                else:
+                    pin.switch_to_input()
+
+    def get_value(self, offset):
+        gpiod_line = sys.modules["gpiod.line"]
+        return gpiod_line.Value.ACTIVE if self._pins[offset].value else gpiod_line.Value.INACTIVE
+
+    def set_value(self, offset, value):
+        self._pins[offset].value = value == sys.modules["gpiod.line"].Value.ACTIVE
+
+    def release(self):
+        pass
+
+
+def _request_lines(path, consumer=None, config=None):
+    return _LineRequest(config)
+
+
+def install():
+    """
+    Register the simulated modules so ``import ds1302`` works off-device.
+    """
+    this = sys.modules[__name__]
+    sys.modules["digitalio"] = this
+    if "micropython" not in sys.modules:
+        micropython = type(sys)("micropython")
+        micropython.const = _const
+        sys.modules["micropython"] = micropython
+
+
+def install_gpiod():
+    """
+    Register a fake libgpiod v2 ``gpiod`` module whose line offsets are
+    simulated pins, for ds1302_gpiod.GpiodTransport.
+    """
+    gpiod = type(sys)("gpiod")
+    line = type(sys)("gpiod.line")
+
+    class _Direction:
+        INPUT = "input"
+        OUTPUT = "output"
+
+    class _Value:
+        INACTIVE = 0
+        ACTIVE = 1
+
+    line.Direction = _Direction
+    line.Value = _Value
+    gpiod.line = line
+    gpiod.LineSettings = _LineSettings
+    gpiod.request_lines = _request_lines
+    sys.modules["gpiod"] = gpiod
+    sys.modules["gpiod.line"] = line
@@ -0,0 +1,242 @@
+# DS1302 Real Time Clock, instrumentation
+# Author: David Boyd
+# License: MIT License (https://opensource.org/licenses/MIT)
+"""
+Per-method statistics for DS1302RTC, to find RTC-induced latency spikes in
+the field.
+
+    stats = rtc.instrument()
+    ...
+    stats.dump()
+
+For every public method this records calls, total and max latency
+(monotonic_ns), bytes moved on the bus, pin writes, time spent waiting on
+bus delays and a latency histogram.  Everything lives in arrays allocated
+once, so collecting does not grow the heap.
+
+attach() hooks the driver by shadowing its methods on the instance;
+detach() deletes the shadows again, so a driver that was never instrumented
+pays nothing.  Pin writes and per-bit waits are derived from the bytes
+moved and the transport's PIN_WRITES / CLK_WAITS, rather than counted pin
+by pin, so instrumenting doesn't slow the bus itself.
+
+AsyncDS1302RTC is instrumented the same way, with its coroutine methods
+timed from the first call to completion, so a method's latency includes any
+time spent waiting for another task to release the bus.  Calls from
+different tasks overlap, so each burst's counts are handed to the task that
+ran it, which holds the driver's lock for the whole burst, and recorded
+against the method when that task's call returns.
+"""
+import array
+import time
+from micropython import const
+
+METHODS = (
+    "read_datetime", "write_datetime", "read_epoch", "write_epoch",
+    "read_dt_bytes", "read_clock_into",
+    "read_ram", "read_ram_into", "write_ram", "write_ram_byte",
+)
+
+# Internal methods hooked besides METHODS, on DS1302RTC and AsyncDS1302RTC.
+_HOOKS = ("_start_tx", "_end_tx")
+_HOOKS_ASYNC = ("_start_tx_async", "_end_tx_async",
+                "_read_burst_async", "_write_burst_async")
+
+# Latency histogram: bucket 0 is under 1us, bucket n covers
+# [2**(n-1), 2**n) us, the last bucket takes everything above.
+BUCKETS = const(20)
+
+
+class DS1302Stats:
+
+    def __init__(self):
+        n = len(METHODS)
+        self.calls = array.array('L', [0] * n)
+        self.total_ns = array.array('Q', [0] * n)
+        self.max_ns = array.array('Q', [0] * n)
+        self.bytes = array.array('L', [0] * n)
+        self.pin_writes = array.array('L', [0] * n)
+        self.sleep_ns = array.array('Q', [0] * n)
+        self.histogram = array.array('L', [0] * (n * BUCKETS))
+        # accumulators for the method (async: the burst) in progress
+        self._bytes = 0
+        self._pin_writes = 0
+        self._sleep_ns = 0
+        # async only: [bytes, pin writes, sleep ns] of finished bursts per
+        # task, until the task's method call returns
+        self._tasks = {}
+
+    def reset(self):
+        for a in (self.calls, self.total_ns, self.max_ns, self.bytes,
+                  self.pin_writes, self.sleep_ns, self.histogram):
+            for i in range(len(a)):
+                a[i] = 0
+
+    def _record(self, index, elapsed):
+        self._add(index, elapsed, self._bytes, self._pin_writes, self._sleep_ns)
+        self._bytes = 0
+        self._pin_writes = 0
+        self._sleep_ns = 0
+
+    def _add(self, index, elapsed, nbytes, pin_writes, sleep_ns):
+        self.calls[index] += 1
+        self.total_ns[index] += elapsed
+        if elapsed > self.max_ns[index]:
+            self.max_ns[index] = elapsed
+        self.bytes[index] += nbytes
+        self.pin_writes[index] += pin_writes
+        self.sleep_ns[index] += sleep_ns
+
+        us = elapsed // 1000
+        bucket = 0
+        while us and bucket < BUCKETS - 1:
+            us >>= 1
+            bucket += 1
+        self.histogram[index * BUCKETS + bucket] += 1
+
+    def dump(self):
+        """
+        Print the statistics, one line per method that was called, followed
+        by its non-empty histogram buckets.
+        """
+        print("{:<16}{:>8}{:>10}{:>10}{:>8}{:>8}{:>10}".format(
+            "method", "calls", "avg us", "max us", "bytes", "pins", "sleep us"))
+        for i, name in enumerate(METHODS):
+            calls = self.calls[i]
+            if not calls:
+                continue
+            print("{:<16}{:>8}{:>10}{:>10}{:>8}{:>8}{:>10}".format(
+                name, calls, self.total_ns[i] // calls // 1000,
+                self.max_ns[i] // 1000, self.bytes[i] // calls,
+                self.pin_writes[i] // calls, self.sleep_ns[i] // calls // 1000))
+            base = i * BUCKETS
+            buckets = []
+            for b in range(BUCKETS):
+                count = self.histogram[base + b]
+                if count:
+                    buckets.append("<{}us:{}".format(1 << b, count))
+            print("    " + " ".join(buckets))
+
+
+def _wrap_method(stats, index, func):
+    def wrapper(*args, **kwargs):
+        start = time.monotonic_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats._record(index, time.monotonic_ns() - start)
+    return wrapper
+
+
+def _wrap_coroutine(stats, index, current_task, func):
+    async def wrapper(*args, **kwargs):
+        start = time.monotonic_ns()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            elapsed = time.monotonic_ns() - start
+            counts = stats._tasks.pop(current_task(), None)
+            if counts is None:
+                stats._add(index, elapsed, 0, 0, 0)
+            else:
+                stats._add(index, elapsed, counts[0], counts[1], counts[2])
+    return wrapper
+
+
+def _wrap_burst_async(stats, current_task, func):
+    async def wrapper(*args):
+        # the caller holds the driver's lock, so until the burst returns
+        # the accumulators count nothing but this burst
+        try:
+            await func(*args)
+        finally:
+            task = current_task()
+            counts = stats._tasks.get(task)
+            if counts is None:
+                counts = stats._tasks[task] = [0, 0, 0]
+            counts[0] += stats._bytes
+            counts[1] += stats._pin_writes
+            counts[2] += stats._sleep_ns
+            stats._bytes = 0
+            stats._pin_writes = 0
+            stats._sleep_ns = 0
+    return wrapper
+
+
+def _wrap_delay(stats, func):
+    def wrapper(tx):
+        start = time.monotonic_ns()
+        func(tx)
+        stats._sleep_ns += time.monotonic_ns() - start
+    return wrapper
+
+
+def _wrap_delay_async(stats, func):
+    async def wrapper(tx):
+        start = time.monotonic_ns()
+        await func(tx)
+        stats._sleep_ns += time.monotonic_ns() - start
+    return wrapper
+
+
+def _wrap_clock(stats, rtc, transport, func, receiving):
+    writes_out, writes_in, writes_frame = transport.PIN_WRITES
+    clk_waits = transport.CLK_WAITS
+
+    if receiving:
+        def wrapper(command, buf, skip, count):
+            func(command, buf, skip, count)
+            received = skip + count
+            stats._bytes += 1 + received
+            stats._pin_writes += writes_frame + writes_out + writes_in * received
+            stats._sleep_ns += (1 + received) * clk_waits * rtc._timing.clk_ns
+    else:
+        def wrapper(command, buf, count):
+            func(command, buf, count)
+            stats._bytes += 1 + count
+            stats._pin_writes += writes_frame + writes_out * (1 + count)
+            stats._sleep_ns += (1 + count) * clk_waits * rtc._timing.clk_ns
+    return wrapper
+
+
+def attach(rtc):
+    """
+    Instrument rtc and return its DS1302Stats.  Attaching twice returns the
+    existing stats.
+    """
+    if rtc.stats is not None:
+        return rtc.stats
+    stats = DS1302Stats()
+    if hasattr(rtc, "_start_tx_async"):
+        from asyncio import current_task
+        for index, name in enumerate(METHODS):
+            setattr(rtc, name, _wrap_coroutine(stats, index, current_task, getattr(rtc, name)))
+        rtc._start_tx_async = _wrap_delay_async(stats, rtc._start_tx_async)
+        rtc._end_tx_async = _wrap_delay_async(stats, rtc._end_tx_async)
+        rtc._read_burst_async = _wrap_burst_async(stats, current_task, rtc._read_burst_async)
+        rtc._write_burst_async = _wrap_burst_async(stats, current_task, rtc._write_burst_async)
+    else:
+        for index, name in enumerate(METHODS):
+            setattr(rtc, name, _wrap_method(stats, index, getattr(rtc, name)))
+        rtc._start_tx = _wrap_delay(stats, rtc._start_tx)
+        rtc._end_tx = _wrap_delay(stats, rtc._end_tx)
+
+    transport = rtc._transport
+    transport.clock_in = _wrap_clock(stats, rtc, transport, transport.clock_in, True)
+    transport.clock_out = _wrap_clock(stats, rtc, transport, transport.clock_out, False)
+    rtc.stats = stats
+    return stats
+
+
+def detach(rtc):
+    """
+    Remove the hooks attach() installed.
+    """
+    if rtc.stats is None:
+        return
+    hooks = _HOOKS_ASYNC if hasattr(rtc, "_start_tx_async") else _HOOKS
+    for name in METHODS + hooks:
+        delattr(rtc, name)
+    del rtc._transport.clock_in
+    del rtc._transport.clock_out
+    rtc.stats = None
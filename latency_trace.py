@@ -0,0 +1,90 @@
+# Per-stage latency tracing for Circuit Playground Express loops
+# Author: David Boyd
+# License: MIT License (https://opensource.org/licenses/MIT)
+"""
+Times the stages of a loop pass with monotonic_ns() into a preallocated
+ring of the last depth passes, and summarises them as p50 / p99 / max.
+
+    trace = LatencyTrace(("wait", "read", "send"))
+    trace.start()
+    while True:
+        trace.lap(0)        # time since start() or the previous lap
+        ...
+        trace.lap(1)
+        ...
+        trace.lap(2)
+        trace.next()
+    ...
+    trace.report()
+
+set() stores a value measured some other way (say, from a timestamp taken
+passes ago) and stages left unset in a pass are ignored in the summary.
+Recording allocates nothing; report() sorts a copy of each stage.
+"""
+import array
+import time
+
+_UNSET = 0xFFFFFFFF
+
+
+class LatencyTrace:
+
+    def __init__(self, stages, depth=256):
+        self.stages = stages
+        self._n = len(stages)
+        self._depth = depth
+        self._ring = array.array('L', [_UNSET] * (depth * self._n))
+        self._base = 0
+        self._pos = 0
+        self.passes = 0
+        self._last = time.monotonic_ns()
+
+    def start(self):
+        """
+        Restart the lap clock, e.g. after a pass that wasn't traced.
+        """
+        self._last = time.monotonic_ns()
+
+    def lap(self, stage):
+        """
+        Record the time since the previous lap as stage, returns now.
+        """
+        now = time.monotonic_ns()
+        self._ring[self._base + stage] = min(now - self._last, _UNSET - 1)
+        self._last = now
+        return now
+
+    def set(self, stage, ns):
+        self._ring[self._base + stage] = min(ns, _UNSET - 1)
+
+    def next(self):
+        """
+        Finish the pass, the oldest one is overwritten once the ring is full.
+        """
+        self.passes += 1
+        self._pos += 1
+        if self._pos == self._depth:
+            self._pos = 0
+        self._base = self._pos * self._n
+        for i in range(self._n):
+            self._ring[self._base + i] = _UNSET
+
+    def percentiles(self, stage):
+        """
+        Return (count, p50, p99, max) in ns for stage over the ring.
+        """
+        ring = self._ring
+        values = sorted(ring[i] for i in range(stage, len(ring), self._n)
+                        if ring[i] != _UNSET)
+        if not values:
+            return 0, 0, 0, 0
+        count = len(values)
+        return (count, values[count // 2], values[min(count * 99 // 100, count - 1)],
+                values[-1])
+
+    def report(self):
+        print("{:<12}{:>7}{:>10}{:>10}{:>10}".format("stage", "n", "p50 us", "p99 us", "max us"))
+        for i, name in enumerate(self.stages):
+            count, p50, p99, top = self.percentiles(i)
+            print("{:<12}{:>7}{:>10.1f}{:>10.1f}{:>10.1f}".format(
+                name, count, p50 / 1000, p99 / 1000, top / 1000))
@@ -0,0 +1,166 @@
+# LIS3DH FIFO batch reader for the Circuit Playground Express accelerometer
+# Author: David Boyd
+# License: MIT License (https://opensource.org/licenses/MIT)
+"""
+Reads the LIS3DH accelerometer through its 32 sample hardware FIFO instead
+of one ``cpx.acceleration`` read per loop.  Each read() is two I2C
+transactions however many samples are waiting: the FIFO level, then one
+burst of all the samples.  The batch is averaged (or its median taken) and
+smoothed with an integer moving average, which takes out hand tremor
+before the acceleration curve.
+
+    fifo = FifoReader(cpx._lis3dh._i2c)
+    fifo.read()
+    x_steps, y_steps = fifo.steps()
+
+Output is in accel_curve steps (1/STEPS_PER_MS2 m/s^2), so it indexes the
+curve tables directly.  Only integer math is done per sample.
+
+The FIFO is put in stream mode on top of the configuration the
+adafruit_lis3dh driver already set up (data rate, range, high resolution);
+cpx.acceleration keeps working alongside it.  cpx_sim simulates the
+registers used here.
+"""
+import array
+from micropython import const
+
+from accel_curve import STEPS_PER_MS2
+
+_REG_CTRL4 = const(0x23)
+_REG_CTRL5 = const(0x24)
+_REG_OUT_X_L = const(0x28)
+_REG_FIFO_CTRL = const(0x2E)
+_REG_FIFO_SRC = const(0x2F)
+_AUTO_INCREMENT = const(0x80)
+
+_FIFO_EN = const(0x40)
+_FIFO_MODE_STREAM = const(0x80)
+_FIFO_OVRN = const(0x40)
+_FIFO_EMPTY = const(0x20)
+_FIFO_FSS = const(0x1F)
+
+FIFO_DEPTH = const(32)
+
+# raw counts per g for each CTRL_REG4 full scale setting, as adafruit_lis3dh
+_DIVIDERS = (16380, 8190, 4096, 1365)
+_STANDARD_GRAVITY = 9.806
+
+
+class FifoReader:
+
+    def __init__(self, i2c, filter_mode="mean", smooth_shift=1):
+        """
+        i2c is the LIS3DH's I2CDevice.  filter_mode "mean" or "median"
+        picks how a batch is reduced to one sample, smooth_shift sets the
+        moving average after it (each batch moves it 1 / 2**smooth_shift
+        of the way, 0 turns it off).
+        """
+        self._i2c = i2c
+        self._cmd = bytearray(2)
+        self._status = bytearray(1)
+        # the FIFO burst reads straight into int16s, x, y, z per sample
+        self._samples = array.array('h', [0] * (3 * FIFO_DEPTH))
+        self._scratch = array.array('h', [0] * FIFO_DEPTH)
+        self._median = filter_mode == "median"
+        self._shift = smooth_shift
+        self.x = 0
+        self.y = 0
+        self.z = 0
+        self._primed = False
+        self.transactions = 0
+        self.batches = 0
+        self.samples = 0
+        self.empty = 0
+        self.overruns = 0
+
+        ctrl5 = self._read_register(_REG_CTRL5)
+        self._write_register(_REG_CTRL5, ctrl5 | _FIFO_EN)
+        self._write_register(_REG_FIFO_CTRL, _FIFO_MODE_STREAM)
+        scale = (self._read_register(_REG_CTRL4) >> 4) & 3
+        # raw counts to curve steps, 16.16 fixed point
+        self._to_steps = round(_STANDARD_GRAVITY * STEPS_PER_MS2 * 65536 / _DIVIDERS[scale])
+
+    def _read_register(self, register):
+        self._cmd[0] = register
+        with self._i2c as i2c:
+            i2c.write_then_readinto(self._cmd, self._status, out_end=1)
+        self.transactions += 1
+        return self._status[0]
+
+    def _write_register(self, register, value):
+        self._cmd[0] = register
+        self._cmd[1] = value
+        with self._i2c as i2c:
+            i2c.write(self._cmd)
+        self.transactions += 1
+
+    def _reduce(self, axis, count):
+        samples = self._samples
+        if not self._median:
+            total = 0
+            for i in range(axis, 3 * count, 3):
+                total += samples[i]
+            return total // count
+        scratch = self._scratch
+        for n in range(count):
+            value = samples[3 * n + axis]
+            j = n
+            while j and scratch[j - 1] > value:
+                scratch[j] = scratch[j - 1]
+                j -= 1
+            scratch[j] = value
+        return scratch[count // 2]
+
+    def _smooth(self, old, new):
+        if not self._primed:
+            return new
+        return old + ((new - old) >> self._shift)
+
+    def read(self):
+        """
+        Drain the FIFO and update x, y, z (raw counts).  Returns the number
+        of samples read, 0 if none had arrived since the last read.
+        """
+        src = self._read_register(_REG_FIFO_SRC)
+        if src & _FIFO_EMPTY:
+            self.empty += 1
+            return 0
+        count = src & _FIFO_FSS
+        if src & _FIFO_OVRN:
+            self.overruns += 1
+            count = FIFO_DEPTH
+        if not count:
+            self.empty += 1
+            return 0
+
+        # with the FIFO on the output address wraps from OUT_Z_H back to
+        # OUT_X_L, so one burst reads every waiting sample (buffer bounds
+        # are in int16 elements)
+        self._cmd[0] = _REG_OUT_X_L | _AUTO_INCREMENT
+        with self._i2c as i2c:
+            i2c.write_then_readinto(self._cmd, self._samples, out_end=1, in_end=3 * count)
+        self.transactions += 1
+        self.batches += 1
+        self.samples += count
+
+        self.x = self._smooth(self.x, self._reduce(0, count))
+        self.y = self._smooth(self.y, self._reduce(1, count))
+        self.z = self._smooth(self.z, self._reduce(2, count))
+        self._primed = True
+        return count
+
+    def _steps(self, value):
+        # rounds toward zero like int(), so the curve stays symmetric
+        if value < 0:
+            return -((-value * self._to_steps) >> 16)
+        return (value * self._to_steps) >> 16
+
+    def steps(self):
+        """
+        The filtered x and y acceleration in accel_curve steps.
+        """
+        return self._steps(self.x), self._steps(self.y)
+
+    def report(self):
+        print("fifo: batches={} samples={} empty={} overruns={} i2c={}".format(
+            self.batches, self.samples, self.empty, self.overruns, self.transactions))
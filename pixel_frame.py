@@ -0,0 +1,99 @@
+# Batched NeoPixel updates for Circuit Playground Express
+# Author: David Boyd
+# License: MIT License (https://opensource.org/licenses/MIT)
+"""
+With auto_write on, every ``cpx.pixels[i] = color`` pushes the whole strip.
+PixelFrame turns auto_write off and collects changes until show(), so a
+frame's worth of assignments costs one push, and assigning a pixel the
+color it already has costs none.
+
+    pixels = PixelFrame(cpx.pixels)
+    pixels[1] = (255, 0, 0)
+    pixels[2] = (0, 255, 0)
+    pixels.show()             # one push
+
+    with pixels:              # or push at the end of the block
+        pixels.fill((0, 0, 0))
+
+pushes, skipped, writes and elided count what happened, push_ns and
+max_push_ns time the pushes themselves.
+"""
+import time
+
+
+class PixelFrame:
+
+    def __init__(self, pixels):
+        self._pixels = pixels
+        pixels.auto_write = False
+        self._colors = [tuple(pixels[i]) for i in range(len(pixels))]
+        self._dirty = False
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.pushes = 0
+        self.skipped = 0
+        self.writes = 0
+        self.elided = 0
+        self.push_ns = 0
+        self.max_push_ns = 0
+
+    def __len__(self):
+        return len(self._colors)
+
+    def __getitem__(self, index):
+        return self._colors[index]
+
+    def __setitem__(self, index, color):
+        self.writes += 1
+        if self._colors[index] == color:
+            self.elided += 1
+            return
+        self._colors[index] = color
+        self._pixels[index] = color
+        self._dirty = True
+
+    def fill(self, color):
+        for i in range(len(self._colors)):
+            self[i] = color
+
+    @property
+    def brightness(self):
+        return self._pixels.brightness
+
+    @brightness.setter
+    def brightness(self, brightness):
+        if brightness != self._pixels.brightness:
+            self._pixels.brightness = brightness
+            self._dirty = True
+
+    @property
+    def dirty(self):
+        return self._dirty
+
+    def show(self):
+        """
+        Push the strip if anything changed since the last push.
+        """
+        if not self._dirty:
+            self.skipped += 1
+            return
+        start = time.monotonic_ns()
+        self._pixels.show()
+        elapsed = time.monotonic_ns() - start
+        self._dirty = False
+        self.pushes += 1
+        self.push_ns += elapsed
+        if elapsed > self.max_push_ns:
+            self.max_push_ns = elapsed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.show()
+
+    def report(self):
+        print("pixels: pushes={} skipped={} writes={} elided={} avg push={}us max push={}us".format(
+            self.pushes, self.skipped, self.writes, self.elided,
+            self.push_ns // max(self.pushes, 1) // 1000, self.max_push_ns // 1000))
@@ -14,13 +14,25 @@
 #  The switch is used as an on/off.  if this doesn't appear to start, try changing the
 #  switch...
 #
+#  Nothing in the game blocks: each part is a generator task that yields how long
+#  it wants to wait, and a small scheduler runs the tasks and sleeps in between,
+#  so tones, lights and touch input overlap and the CPU idles while waiting.
+#  Simon's sequence isn't stored: each color is worked out from the game's seed
+#  and its position, so a game of any length uses the same memory.  The seed is
+#  printed at the start of each game; set REPLAY_SEED to it to play that game again.
+#  The touch pads are read by a TouchScanner task every SCAN_INTERVAL, which
+#  tracks each pad's baseline and debounces them into press events by color.
+#
 # Author: David Boyd
 # License: MIT License (https://opensource.org/licenses/MIT)
 
 from adafruit_circuitplayground.express import cpx
 import time
-import array
 import random
+import touchio
+import board
+from pixel_frame import PixelFrame
+from touch_scanner import TouchScanner
 
 
 # ID, Pixel Index, Tone, high, low
@@ -28,9 +40,72 @@ RED_ID = [1, 1, 440, (125,0,0), (5,0,0)]
 YELLOW_ID = [2, 6, 550, (125,125,0), (5,5,0)]
 GREEN_ID = [3, 3, 330, (0, 125, 0),(0,5,0)]
 BLUE_ID = [4, 8,  660, (0,0,125),(0,0,5)]
+COLOR_IDS = (RED_ID, YELLOW_ID, GREEN_ID, BLUE_ID)
+
+# seed for every game, None picks a new one each game
+REPLAY_SEED = None
+
+# seconds between touch pad / button polls
+POLL_INTERVAL = 0.02
+# seconds between touch pad scans
+SCAN_INTERVAL = 0.015
+# seconds per step of the waiting-to-start animation
+ATTRACT_STEP = 0.15
+
+# pixel changes are pushed to the strip on pixels.show()
+pixels = PixelFrame(cpx.pixels)
+
+# the pads by each light, and the color they answer as
+TOUCH_PADS = ((board.A1, YELLOW_ID), (board.A2, BLUE_ID), (board.A3, BLUE_ID),
+              (board.A4, RED_ID), (board.A5, RED_ID),
+              (board.A6, GREEN_ID), (board.A7, GREEN_ID))
+scanner = TouchScanner([touchio.TouchIn(pin) for pin, color in TOUCH_PADS],
+                       [color[0] for pin, color in TOUCH_PADS])
+
+def _mix(x):
+    # 16 bit integer hash, every step stays a CircuitPython small int
+    x &= 0xFFFF
+    x ^= x >> 8
+    x = (x * 0x2C1B) & 0xFFFF
+    x ^= x >> 7
+    x = (x * 0x3A8D) & 0xFFFF
+    x ^= x >> 9
+    return x
+
+
+class Sequence:
+    '''
+        Simon's sequence of color ids, generated from a 30 bit seed.
+        Color i is hashed from the seed and i, so any color can be looked
+        up without storing the ones before it.  Indexing, len() and
+        iteration work like the array it replaces.
+    '''
+    def __init__(self, seed=0):
+        self.restart(seed)
+
+    def restart(self, seed):
+        self.seed = seed & 0x3FFFFFFF
+        self._low = self.seed & 0x7FFF
+        self._high = self.seed >> 15
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError("sequence index out of range")
+        return ((_mix(self._high ^ _mix(i ^ self._low)) >> 6) & 3) + 1
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield self[i]
+
 
 # simons sequence 
-simon = array.array('b',)
+simon = Sequence()
 
 # score needed to win
 to_win = 35
@@ -42,6 +117,64 @@ to_win = 35
 note_bad = 240
 
 
+class Scheduler:
+    '''
+        Runs generator tasks cooperatively.  A task yields the number of
+        seconds until it wants to run again; between tasks the scheduler
+        sleeps, and counts how long it slept in idle_ns.
+    '''
+    def __init__(self):
+        self._tasks = []
+        self.busy_ns = 0
+        self.idle_ns = 0
+
+    def spawn(self, task):
+        self._tasks.append([task, time.monotonic_ns()])
+        return task
+
+    def cancel(self, task):
+        for entry in self._tasks:
+            if entry[0] is task:
+                self._tasks.remove(entry)
+                task.close()
+                return
+
+    def run(self):
+        '''
+            Run until every task has finished.
+        '''
+        last = time.monotonic_ns()
+        while self._tasks:
+            now = time.monotonic_ns()
+            for entry in list(self._tasks):
+                if entry[1] <= now and entry in self._tasks:
+                    try:
+                        delay = next(entry[0])
+                    except StopIteration:
+                        self._tasks.remove(entry)
+                        continue
+                    entry[1] = now + int((delay or 0) * 1000000000)
+            if not self._tasks:
+                break
+            wake = min(entry[1] for entry in self._tasks)
+            now = time.monotonic_ns()
+            self.busy_ns += now - last
+            if wake > now:
+                time.sleep((wake - now) / 1000000000)
+                last = time.monotonic_ns()
+                self.idle_ns += last - now
+            else:
+                last = now
+        self.busy_ns += time.monotonic_ns() - last
+
+    def idle_fraction(self):
+        total = self.busy_ns + self.idle_ns
+        return self.idle_ns / total if total else 0.0
+
+
+scheduler = Scheduler()
+
+
 def display_score(score):
     '''
         display the score 
@@ -49,7 +182,7 @@ def display_score(score):
     print("Score: ", score)
     if len(simon) >= to_win:
         for i in range(16):
-            play_color_tone((i % 4) + 1, .2)
+            yield from play_color_tone((i % 4) + 1, .2)
         print("Yay!  You beat the game")
 
     
@@ -58,44 +191,58 @@ def reset():
         Reset game
     '''
     # print('reset')
-    cpx.pixels.fill((0,0,0))
-    cpx.pixels.brightness = 0.3
+    pixels.fill((0,0,0))
+    pixels.brightness = 0.3
+    pixels.show()
 
     # this will initialize the neopixels    
     for i in range(5):
-        play_color_tone(i, .5 )
+        yield from play_color_tone(i, .5 )
         
     # seed random generator
     random.seed(int((cpx.temperature + cpx.light) * time.monotonic()))
-
+    seed = REPLAY_SEED if REPLAY_SEED is not None else random.getrandbits(30)
+    simon.restart(seed)
 
 
 def play_color_tone(color_id, wait = 1.0):
     '''
-        Play selected tone and highlight color
+        Play selected tone and highlight color, without blocking
     '''
-    if color_id == RED_ID[0]: # RED
-        cpx.pixels[RED_ID[1]] = RED_ID[3]
-        cpx.play_tone(RED_ID[2], wait)
-        cpx.pixels[RED_ID[1]] = RED_ID[4]
-        
-    elif color_id == YELLOW_ID[0]: # YELLOW
-        cpx.pixels[YELLOW_ID[1]] = YELLOW_ID[3]
-        cpx.play_tone(YELLOW_ID[2], wait)
-        cpx.pixels[YELLOW_ID[1]] = YELLOW_ID[4]
-
-    elif color_id == GREEN_ID[0]: # GREEN
-        cpx.pixels[GREEN_ID[1]] = GREEN_ID[3]
-        cpx.play_tone(GREEN_ID[2], wait)
-        cpx.pixels[GREEN_ID[1]] = GREEN_ID[4]
+    if 1 <= color_id <= len(COLOR_IDS):
+        color = COLOR_IDS[color_id - 1]
+        pixels[color[1]] = color[3]
+        pixels.show()
+        cpx.start_tone(color[2])
+        yield wait
+        cpx.stop_tone()
+        pixels[color[1]] = color[4]
+        pixels.show()
+    else:
+        cpx.start_tone(note_bad)
+        yield wait
+        cpx.stop_tone()
 
-    elif color_id == BLUE_ID[0]: # BLUE
-        cpx.pixels[BLUE_ID[1]] = BLUE_ID[3]
-        cpx.play_tone(BLUE_ID[2], wait)
-        cpx.pixels[BLUE_ID[1]] = BLUE_ID[4]
 
-    else:
-        cpx.play_tone(note_bad, wait)
+def attract():
+    '''
+        Chase the colors round while waiting for a game to start, runs
+        until cancelled
+    '''
+    step = 0
+    try:
+        while True:
+            for color in COLOR_IDS:
+                pixels[color[1]] = color[4]
+            color = COLOR_IDS[step % len(COLOR_IDS)]
+            pixels[color[1]] = color[3]
+            pixels.show()
+            step += 1
+            yield ATTRACT_STEP
+    finally:
+        for color in COLOR_IDS:
+            pixels[color[1]] = color[4]
+        pixels.show()
 
 
 def play_sequence():
@@ -107,26 +254,32 @@ def play_sequence():
         speed = max(1.0 - (len(simon) * 4 / 100), .2)
         
         for i in simon:
-            time.sleep(max(speed - 0.5, .02))
-            play_color_tone(i,speed)
+            yield max(speed - 0.5, .02)
+            yield from play_color_tone(i,speed)
+
+
+def scan_touch():
+    '''
+        Scan the touch pads every SCAN_INTERVAL while the switch is on
+    '''
+    while cpx.switch:
+        scanner.scan()
+        yield SCAN_INTERVAL
 
 
 def get_touch():
     '''
-        Get Touch pad
+        Wait for the next touch pad press, returns its color id
     '''
     while cpx.switch:   # this will handle if the switch is turned off at this stage
-        if cpx.touch_A4 or cpx.touch_A5:
-            return RED_ID[0]
-        
-        if cpx.touch_A6 or cpx.touch_A7:
-            return GREEN_ID[0]
+        event = scanner.get()
+        while event is not None:
+            color, pressed, at_ns = event
+            if pressed:
+                return color
+            event = scanner.get()
 
-        if cpx.touch_A1:
-            return YELLOW_ID[0]
-
-        if cpx.touch_A2 or cpx.touch_A3:
-            return BLUE_ID[0]
+        yield POLL_INTERVAL
 
 
 def validate_choice(idx, touch):
@@ -135,15 +288,15 @@ def validate_choice(idx, touch):
         plays appropriate tone
     '''
     if simon[idx] == touch:
-        play_color_tone(touch, 0.7)
+        yield from play_color_tone(touch, 0.7)
         return True
     else:
-        play_color_tone(0, 1.5)
+        yield from play_color_tone(0, 1.5)
         # let them know what the correct color was...
-        time.sleep(1)
-        play_color_tone(simon[idx], 0.25)
-        play_color_tone(simon[idx], 0.25)
-        time.sleep(1)
+        yield 1
+        yield from play_color_tone(simon[idx], 0.25)
+        yield from play_color_tone(simon[idx], 0.25)
+        yield 1
         return False
 
 
@@ -151,12 +304,14 @@ def players_guess():
     '''
         gets the players guess at the sequence
     '''
-    guess = array.array('b',)
     correct = True
     idx = 0
+    # touches made while simon was playing don't count
+    scanner.clear()
 
     while cpx.switch and correct and idx < len(simon):
-        correct = validate_choice(idx, get_touch())
+        touch = yield from get_touch()
+        correct = yield from validate_choice(idx, touch)
         idx += 1
 
     return correct
@@ -164,10 +319,29 @@ def players_guess():
 
 def add_to_sequence():
     '''
-        adds a random number to the sequence
+        adds the next color to the sequence
     '''
-    rand_num = random.randint(1,4)
-    simon.append(rand_num)
+    simon.length += 1
+
+
+def wait_for_start():
+    '''
+        wait for the player to push a button to start, returns True
+        for button B (verbose score)
+    '''
+    animation = scheduler.spawn(attract())
+    verbose_score = False
+    try:
+        while cpx.switch:
+            if cpx.button_a:
+                break
+            if cpx.button_b:
+                verbose_score = True
+                break
+            yield POLL_INTERVAL
+    finally:
+        scheduler.cancel(animation)
+    return verbose_score
 
 
 def play_game(verbose_score):
@@ -181,11 +355,11 @@ def play_game(verbose_score):
         add_to_sequence()
 
         # play tones
-        play_sequence()
+        yield from play_sequence()
 
         # wait for player input
         cpx.red_led = True
-        winning = players_guess()
+        winning = yield from players_guess()
         cpx.red_led = False
 
         if len(simon) >= to_win:
@@ -193,38 +367,37 @@ def play_game(verbose_score):
 
         if winning:
             if verbose_score:
-                display_score(len(simon))
-            time.sleep(1)
+                yield from display_score(len(simon))
+            yield 1
 
 
+def game():
+    '''
+        One game after another while the switch is on
+    '''
+    while cpx.switch:
+        yield from reset()
 
-while cpx.switch:
-    reset()
-    if len(simon) > 0:
-        del simon
-        simon = array.array('b',) # (i for i in range(35)))  # test score
+        # print a blank line...
+        print()
+        print("Press Button A or Button B to start new game")
+        print("Game seed:", simon.seed)
 
-    # print a blank line...
-    print()
-    print("Press Button A or Button B to start new game")
-    
-    # wait for the player to push a button to restart
-    waiting = True
-    verbose_score = False
+        verbose_score = yield from wait_for_start()
 
-    while waiting and cpx.switch:
-        if cpx.button_a:
-            waiting = False
+        yield from play_game(verbose_score)
+        yield from display_score(len(simon))
+        if verbose_score:
+            pixels.report()
+            scanner.report()
+            print("cpu idle {:.1f}%".format(scheduler.idle_fraction() * 100))
 
-        if cpx.button_b:
-            verbose_score = True
-            waiting = False
-        
-        time.sleep(0.1)
-    
-    play_game(verbose_score)
-    display_score(len(simon))
+
+scheduler.spawn(scan_touch())
+scheduler.spawn(game())
+scheduler.run()
 
 if not cpx.switch:
-    cpx.pixels.fill((0, 0, 0))
+    pixels.fill((0, 0, 0))
+    pixels.show()
     print("switch is off")
@@ -0,0 +1,138 @@
+# Capacitive touch pad scanner for Circuit Playground Express
+# Author: David Boyd
+# License: MIT License (https://opensource.org/licenses/MIT)
+"""
+Scans a set of touchio.TouchIn pads in one pass, tracks a baseline for
+each and turns them into debounced press / release events for groups of
+pads (several pads can share one id, like the two red pads in simon_game).
+
+    pads = [touchio.TouchIn(pin) for pin in (board.A1, board.A4, board.A5)]
+    scanner = TouchScanner(pads, (1, 2, 2))
+    while True:
+        scanner.scan()
+        event = scanner.get()       # (id, pressed, monotonic_ns) or None
+        ...
+
+scan() reads every pad's raw_value into an array.  A pad counts as touched
+once it is PRESS_DELTA above its baseline for DEBOUNCE_SCANS scans in a row,
+and as released once it is back under RELEASE_DELTA for as many scans; the
+gap between the two is the hysteresis.  The baseline follows an untouched
+pad slowly (1 / 2**BASELINE_SHIFT of the way per scan) so temperature and
+humidity drift don't look like touches, and is frozen while it is touched.
+
+Call scan() at a fixed rate, every 10 to 20 ms is plenty.  scans, scan_ns
+and max_scan_ns time the passes.
+"""
+import array
+import time
+
+from debounce import Debouncer
+
+PRESS_DELTA = 100
+RELEASE_DELTA = 60
+DEBOUNCE_SCANS = 2
+BASELINE_SHIFT = 4
+
+
+class TouchScanner:
+
+    def __init__(self, pads, ids, queue_size=16):
+        """
+        pads are TouchIn objects, ids[i] the id pad i reports as.  The pads
+        must not be touched while this runs, it takes their baselines.
+        """
+        n = len(pads)
+        self._pads = pads
+        self._pad_ids = ids
+        # distinct ids in first-seen order, the event index is a position here
+        self.ids = []
+        for pad_id in ids:
+            if pad_id not in self.ids:
+                self.ids.append(pad_id)
+        self._group = bytearray(self.ids.index(pad_id) for pad_id in ids)
+        self.raw = array.array('H', [0] * n)
+        self.baseline = array.array('H', [0] * n)
+        self._touched = bytearray(n)
+        self._count = bytearray(n)
+        self._group_touched = bytearray(len(self.ids))
+        self.scans = 0
+        self.scan_ns = 0
+        self.max_scan_ns = 0
+
+        for i in range(n):
+            self.baseline[i] = pads[i].raw_value
+        # debouncing is done here on the raw values, the Debouncer only
+        # turns group state changes into queued events
+        self._events = Debouncer(
+            [self._group_reader(g) for g in range(len(self.ids))], 0, queue_size)
+
+    def _group_reader(self, group):
+        return lambda: self._group_touched[group]
+
+    def scan(self):
+        """
+        Read every pad once and queue any presses and releases.
+        """
+        start = time.monotonic_ns()
+        pads = self._pads
+        raw = self.raw
+        for i in range(len(pads)):
+            raw[i] = pads[i].raw_value
+
+        baseline = self.baseline
+        touched = self._touched
+        count = self._count
+        groups = self._group_touched
+        for g in range(len(groups)):
+            groups[g] = 0
+        for i in range(len(raw)):
+            delta = raw[i] - baseline[i]
+            if touched[i]:
+                crossing = delta < RELEASE_DELTA
+            else:
+                crossing = delta > PRESS_DELTA
+                if not crossing:
+                    baseline[i] += (raw[i] - baseline[i]) >> BASELINE_SHIFT
+            if crossing:
+                count[i] += 1
+                if count[i] >= DEBOUNCE_SCANS:
+                    touched[i] = 1 - touched[i]
+                    count[i] = 0
+            else:
+                count[i] = 0
+            if touched[i]:
+                groups[self._group[i]] = 1
+        self._events.poll()
+
+        elapsed = time.monotonic_ns() - start
+        self.scans += 1
+        self.scan_ns += elapsed
+        if elapsed > self.max_scan_ns:
+            self.max_scan_ns = elapsed
+
+    def touched(self, pad_id):
+        """
+        Debounced state of the pads with pad_id.
+        """
+        return bool(self._group_touched[self.ids.index(pad_id)])
+
+    def get(self):
+        """
+        Return the oldest event as (id, pressed, monotonic_ns), or None.
+        """
+        event = self._events.get()
+        if event is None:
+            return None
+        return self.ids[event[0]], event[1], event[2]
+
+    def clear(self):
+        """
+        Drop queued events.
+        """
+        while self._events.get() is not None:
+            pass
+
+    def report(self):
+        print("touch: scans={} avg scan={}us max scan={}us baselines={}".format(
+            self.scans, self.scan_ns // max(self.scans, 1) // 1000,
+            self.max_scan_ns // 1000, list(self.baseline)))